@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FoodgramApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodgram_api'
+
+    def ready(self):
+        import foodgram_api.signals  # noqa: F401
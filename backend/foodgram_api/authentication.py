@@ -0,0 +1,57 @@
+"""Аутентификация по токену с кэшированием токена и пользователя.
+
+Токен вместе с пользователем хранится в общем кэше
+AUTH_TOKEN_CACHE_TIMEOUT секунд, поэтому запрос с известным токеном
+не обращается к БД. Запись сбрасывается при удалении токена (выход),
+смене пароля и любом сохранении пользователя, в том числе
+деактивации. Счётчики закэшированного пользователя могут отставать,
+поэтому пользователь сохраняется только с update_fields.
+"""
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def get_cache_key(key):
+    """Ключ кэша по хэшу токена, чтобы токен не попадал в кэш открыто."""
+    return f'users:auth_token:{sha256(key.encode()).hexdigest()}'
+
+
+def forget_token(key):
+    cache.delete(get_cache_key(key))
+
+
+def forget_user(user):
+    """Сбрасывает закэшированные токены пользователя."""
+    cache.delete_many([
+        get_cache_key(key)
+        for key in Token.objects.filter(user=user).values_list(
+            'key', flat=True
+        )
+    ])
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который кэширует найденный токен."""
+
+    def authenticate_credentials(self, key):
+        cache_key = get_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            try:
+                token = (
+                    self.get_model().objects.select_related('user')
+                    .get(key=key)
+                )
+            except self.get_model().DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
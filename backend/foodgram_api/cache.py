@@ -0,0 +1,94 @@
+"""Кэширование ответов API и условные GET-запросы."""
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag
+)
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_request_digest(request, *parts):
+    """Хэш хоста, нормализованной строки запроса и дополнительных частей.
+
+    Порядок параметров и повторяющихся значений не влияет на результат.
+    """
+    query = '&'.join(
+        f'{name}={value}'
+        for name in sorted(request.query_params)
+        for value in sorted(request.query_params.getlist(name))
+    )
+    source = '|'.join(
+        str(part) for part in (request.get_host(), query, *parts)
+    )
+    return md5(source.encode(), usedforsecurity=False).hexdigest()
+
+
+def get_response_cache_key(request, prefix, versions, *args):
+    """Ключ кэша по версиям данных, хосту и нормализованной строке запроса."""
+    digest = get_request_digest(request)
+    parts = (prefix, *versions, *args, digest)
+    return ':'.join(str(part) for part in parts)
+
+
+def cache_anonymous_response(prefix, versions_method):
+    """Кэширует успешные ответы действия viewset для анонимов.
+
+    versions_method - имя метода viewset, возвращающего версии данных
+    для тех же аргументов, что и действие. Ответ хранится до изменения
+    любой из версий или истечения ANONYMOUS_RESPONSE_CACHE_TIMEOUT.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return view_method(self, request, *args, **kwargs)
+            versions = getattr(self, versions_method)(
+                request, *args, **kwargs
+            )
+            key = get_response_cache_key(
+                request, prefix, versions, *kwargs.values()
+            )
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(
+                    key,
+                    response.data,
+                    settings.ANONYMOUS_RESPONSE_CACHE_TIMEOUT
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_response(etag_method):
+    """Поддерживает If-None-Match для действия viewset.
+
+    etag_method - имя метода viewset, который дёшево, без сериализации,
+    вычисляет ETag по тем же аргументам, что и действие. Если метод
+    вернул None, запрос обрабатывается как обычно.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            etag = getattr(self, etag_method)(request, *args, **kwargs)
+            if etag is None:
+                return view_method(self, request, *args, **kwargs)
+            etag = quote_etag(etag)
+            response = get_conditional_response(request._request, etag=etag)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code in (
+                status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+            ):
+                response.headers['ETag'] = etag
+                patch_vary_headers(response, ('Authorization',))
+            return response
+        return wrapper
+    return decorator
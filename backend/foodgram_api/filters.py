@@ -1,22 +1,50 @@
+from django.db import connections
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Upper
+from django.contrib.postgres.search import TrigramSimilarity
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+from recipes.tags import get_tag_choices, get_tag_registry
 
 
 class RecipeFilter(FilterSet):
+    """Фильтры ленты рецептов.
+
+    ordering=popular сортирует по числу добавлений в избранное,
+    ordering=trending - по рейтингу, который периодически пересчитывает
+    команда update_trending_scores. Обе сортировки идут по индексам.
+    search ищет по названию, описанию и ингредиентам; без явного
+    ordering результаты упорядочены по релевантности. tags отбирает
+    рецепты хотя бы с одним из тегов; слаги проверяются и переводятся
+    в id по снимку тегов в памяти процесса.
+    """
+
+    ORDERINGS = {
+        'popular': ('-favorites_count', '-pub_date', '-id'),
+        'trending': ('-trending_score', '-pub_date', '-id'),
+    }
+
     author = filters.AllValuesMultipleFilter(
         field_name='author__id',
     )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags',
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart',
         label='shopping_cart',
     )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'По популярности'),
+            ('trending', 'По трендам'),
+        ),
+        method='filter_ordering',
+    )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -26,8 +54,25 @@ class RecipeFilter(FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'ordering',
+            'search',
         )
 
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        queryset = queryset.search(value)
+        if self.form.cleaned_data.get('ordering'):
+            return queryset
+        return queryset.order_by('-search_rank', '-pub_date', '-id')
+
+    def filter_tags(self, queryset, name, value):
+        return queryset.with_any_tag(get_tag_registry().get_ids(value))
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
             return queryset.filter(favorited_by__user=self.request.user)
@@ -43,8 +88,49 @@ class RecipeFilter(FilterSet):
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
+    """Поиск ингредиентов для автодополнения.
+
+    По умолчанию ищет по началу названия; mode=contains ищет по
+    вхождению, mode=fuzzy на PostgreSQL добавляет похожие по триграммам
+    названия. Совпадения по началу названия всегда идут первыми.
+    """
+
+    name = filters.CharFilter(method='filter_name')
+    mode = filters.ChoiceFilter(
+        choices=(
+            ('prefix', 'По началу названия'),
+            ('contains', 'По вхождению'),
+            ('fuzzy', 'По похожести'),
+        ),
+        method='filter_mode',
+    )
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+    def filter_mode(self, queryset, name, value):
+        return queryset
+
+    def filter_name(self, queryset, name, value):
+        mode = self.form.cleaned_data.get('mode') or 'prefix'
+        if mode == 'prefix':
+            return queryset.filter(name__istartswith=value)
+
+        query = value.upper()
+        queryset = queryset.annotate(
+            name_upper=Upper('name'),
+            is_prefix=ExpressionWrapper(
+                Q(name__istartswith=value), output_field=BooleanField()
+            ),
+        )
+        condition = Q(name__icontains=value)
+        ordering = ('-is_prefix', 'name')
+        if (mode == 'fuzzy'
+                and connections[queryset.db].vendor == 'postgresql'):
+            queryset = queryset.annotate(
+                similarity=TrigramSimilarity('name_upper', query)
+            )
+            condition |= Q(name_upper__trigram_similar=query)
+            ordering = ('-is_prefix', '-similarity', 'name')
+        return queryset.filter(condition).order_by(*ordering)
@@ -0,0 +1,174 @@
+"""Метрики запросов: число SQL-запросов, время БД, представления,
+рендеринга и ответа.
+
+Метрики копятся в памяти процесса и отдаются в формате Prometheus
+по адресу /metrics, который nginx наружу не проксирует.
+"""
+import logging
+from collections import defaultdict
+from contextlib import ExitStack
+from threading import Lock
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+METRICS = (
+    ('requests', 'Number of handled requests'),
+    ('request_queries', 'Number of SQL queries'),
+    ('request_db_seconds', 'Time spent in SQL queries'),
+    ('request_app_seconds', 'Time spent in views outside of SQL'),
+    ('request_render_seconds', 'Time spent rendering responses'),
+    ('request_duration_seconds', 'Total request latency'),
+)
+
+
+class QueryTimer:
+    """Обёртка выполнения SQL, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += perf_counter() - started
+
+
+class MetricsRegistry:
+    """Суммы метрик по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._totals = defaultdict(lambda: [0] * len(METRICS))
+
+    def observe(self, view, *values):
+        with self._lock:
+            totals = self._totals[view]
+            for index, value in enumerate((1, *values)):
+                totals[index] += value
+
+    def render(self):
+        with self._lock:
+            totals = {
+                view: list(values) for view, values in self._totals.items()
+            }
+        lines = []
+        for index, (name, description) in enumerate(METRICS):
+            name = f'foodgram_{name}_total'
+            lines.append(f'# HELP {name} {description}.')
+            lines.append(f'# TYPE {name} counter')
+            for view, values in sorted(totals.items()):
+                lines.append(f'{name}{{view="{view}"}} {values[index]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def get_view_name(request, view_func):
+    """Имя представления, для viewset - вместе с действием."""
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if cls is None:
+        return view_func.__name__
+    if actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{cls.__name__}.{action}'
+    return cls.__name__
+
+
+class RequestMetricsMiddleware:
+    """Замеряет запросы и добавляет к ответу заголовок Server-Timing.
+
+    Включается настройкой REQUEST_METRICS_ENABLED. Время app - это
+    время работы представления без SQL-запросов (для DRF сюда входит
+    и сериализация), render - время Response.render. Запросы сверх
+    REQUEST_QUERY_BUDGET запросов к БД или REQUEST_LATENCY_BUDGET
+    секунд попадают в лог.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        request._metrics = {'timer': timer, 'view': 'unresolved'}
+        started = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        finished = perf_counter()
+
+        metrics = request._metrics
+        total = finished - started
+        app = render = 0.0
+        if 'view_started' in metrics:
+            view_finished = metrics.get('render_started', finished)
+            app = max(
+                view_finished - metrics['view_started']
+                - (metrics.get('render_db', timer.duration)
+                   - metrics['view_db']),
+                0.0,
+            )
+        if 'render_finished' in metrics:
+            render = metrics['render_finished'] - metrics['render_started']
+        registry.observe(
+            metrics['view'], timer.count, timer.duration, app, render, total
+        )
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timer.duration * 1000:.1f};'
+            f'desc="{timer.count} queries"',
+            f'app;dur={app * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        if (
+            timer.count > settings.REQUEST_QUERY_BUDGET
+            or total > settings.REQUEST_LATENCY_BUDGET
+        ):
+            logger.warning(
+                '%s %s (%s): %d queries, db %.1f ms, total %.1f ms',
+                request.method, request.path, metrics['view'],
+                timer.count, timer.duration * 1000, total * 1000,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = request._metrics
+        metrics['view'] = get_view_name(request, view_func)
+        metrics['view_started'] = perf_counter()
+        metrics['view_db'] = metrics['timer'].duration
+
+    def process_template_response(self, request, response):
+        """Засекает Response.render, который Django вызывает следом."""
+        metrics = request._metrics
+
+        def finish_render(response):
+            metrics['render_finished'] = perf_counter()
+
+        response.add_post_render_callback(finish_render)
+        metrics['render_started'] = perf_counter()
+        metrics['render_db'] = metrics['timer'].duration
+        return response
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not settings.REQUEST_METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
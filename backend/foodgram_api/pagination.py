@@ -1,5 +1,137 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipePagination(LimitPagination):
+    """Пагинация ленты рецептов с опциональным keyset-режимом.
+
+    Если в запросе есть параметр cursor (для первой страницы - пустой),
+    страница выбирается по ключу (pub_date, id) без OFFSET и COUNT(*).
+    С count=approximate в ответ добавляется оценка числа рецептов
+    по плану запроса PostgreSQL. Ключ курсора совпадает только
+    с сортировкой по умолчанию, поэтому с параметрами ordering
+    и search (результаты поиска упорядочены по релевантности)
+    используется обычная постраничная пагинация.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    search_query_param = 'search'
+    count_query_param = 'count'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (
+            self.cursor_query_param in request.query_params
+            and not request.query_params.get(self.ordering_query_param)
+            and not request.query_params.get(
+                self.search_query_param, ''
+            ).strip()
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count = self.get_approximate_count(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        def fetch(position, limit):
+            page = queryset
+            if position is not None:
+                pub_date, pk = position
+                page = page.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+                )
+            return page[:limit]
+
+        return self.paginate_keyset(
+            request, fetch, lambda recipe: (recipe.pub_date, recipe.pk)
+        )
+
+    def paginate_keyset(self, request, fetch, get_position):
+        """Страница по ключу (pub_date, id) после позиции из курсора.
+
+        fetch(position, limit) возвращает не больше limit элементов
+        после позиции, get_position - ключ элемента.
+        """
+        self.keyset = True
+        self.request = request
+        self.count = getattr(self, 'count', None)
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        results = list(fetch(position, page_size + 1))
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = get_position(results[-1])
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        response = {'next': self.get_next_cursor_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(*self.next_position),
+        )
+
+    def encode_cursor(self, pub_date, pk):
+        position = f'{pub_date.isoformat()}|{pk}'.encode()
+        return urlsafe_b64encode(position).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = (
+                urlsafe_b64decode(cursor.encode()).decode().split('|')
+            )
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def get_approximate_count(self, queryset):
+        """Оценивает число строк по EXPLAIN вместо COUNT(*).
+
+        На других СУБД возвращает точное значение.
+        """
+        queryset = queryset.order_by()
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return queryset.count()
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
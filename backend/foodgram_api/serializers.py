@@ -1,21 +1,61 @@
 from django.contrib.auth.password_validation import validate_password
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from foodgram_api.authentication import forget_user
+from foodgram_api.uploads import ImageUploadField
+from foodgram_api.viewer import ViewerListSerializer, get_viewer_state
+from recipes.images import get_variant
 from recipes.models import (
-    Ingredient, Tag, RecipeIngredient, Recipe, MAX_INGREDIENT_AMOUNT,
-    MIN_INGREDIENT_AMOUNT, MIN_COOKING_TIME, MAX_COOKING_TIME
+    Ingredient, Tag, RecipeIngredient, Recipe, ShoppingCartTotal,
+    MAX_INGREDIENT_AMOUNT, MIN_INGREDIENT_AMOUNT,
+    MIN_COOKING_TIME, MAX_COOKING_TIME
 )
+from recipes.tags import get_tag_registry
 from users.models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_image_url(request, field_file, variants, variant=None):
+    """URL изображения или его уменьшенной копии variant, если она готова."""
+    url = field_file.storage.url(get_variant(field_file, variants, variant))
+    return request.build_absolute_uri(url) if request else url
+
+
+class AvatarMixin(serializers.Serializer):
+    """Отдаёт уменьшенную копию аватара вместо оригинала."""
+
+    avatar = serializers.SerializerMethodField()
+
+    def get_avatar(self, obj):
+        if not obj.avatar:
+            return None
+        return get_image_url(
+            self.context.get('request'), obj.avatar, obj.avatar_variants,
+            'thumbnail'
+        )
+
+
+class UpdateFieldsMixin:
+    """Сохраняет при обновлении только переданные поля.
+
+    Полное сохранение перезаписало бы счётчики пользователя, которые
+    меняются отдельными UPDATE-запросами.
+    """
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class UserSerializer(
+    UpdateFieldsMixin, AvatarMixin, serializers.ModelSerializer
+):
     """Сериализатор модели User."""
 
     password = serializers.CharField(write_only=True)
     is_subscribed = serializers.SerializerMethodField()
-    avatar = serializers.ImageField(read_only=True)
 
     class Meta:
         model = User
@@ -31,6 +71,7 @@ class UserSerializer(serializers.ModelSerializer):
         )
         extra_kwargs = {"password": {"write_only": True},
                         "email": {"required": True}}
+        list_serializer_class = ViewerListSerializer
 
     def create(self, validated_data):
         """Создание пользователя."""
@@ -44,12 +85,18 @@ class UserSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+    def update(self, instance, validated_data):
+        if 'password' in validated_data:
+            instance.set_password(validated_data.pop('password'))
+            validated_data['password'] = instance.password
+        return super().update(instance, validated_data)
+
+    def expect_viewer_state(self, state, users):
+        state.expect('subscriptions', [user.pk for user in users])
+
     def get_is_subscribed(self, obj):
         """Проверка подписки на автора."""
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.follower.filter(author=obj).exists()
+        return get_viewer_state(self.context).has('subscriptions', obj.pk)
 
     def validate_password(self, value):
         """Валидация пароля."""
@@ -89,14 +136,21 @@ class SetPasswordSerializer(serializers.Serializer):
         user = self.context["request"].user
         new_password = self.validated_data["new_password"]
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=['password'])
+        forget_user(user)
         return user
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    is_subscribed = serializers.SerializerMethodField()
+class SubscriptionSerializer(AvatarMixin, serializers.ModelSerializer):
+    """Сериализатор подписки на автора.
+
+    Ожидает пользователей из UserViewSet.get_subscriptions_queryset:
+    is_subscribed и recipes_preview уже подготовлены.
+    """
+
+    is_subscribed = serializers.BooleanField(read_only=True)
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -112,32 +166,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             "avatar",
         )
 
-    def get_is_subscribed(self, obj):
-        user = self.context["request"].user
-        return user.follower.filter(author=obj).exists()
-
     def get_recipes(self, obj):
-        request = self.context["request"]
-        limit = request.query_params.get("recipes_limit")
-
-        qs = obj.recipes.all()
-        if limit and limit.isdigit():
-            qs = qs[:int(limit)]
-
         return ShortRecipeSerializer(
-            qs,
+            obj.recipes_preview,
             many=True,
-            context={"request": request}
+            context=self.context
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
-class AvatarSerializer(serializers.ModelSerializer):
+class AvatarSerializer(UpdateFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для добавления или удаления аватара."""
 
-    avatar = Base64ImageField(required=True)
+    avatar = ImageUploadField(required=True)
 
     class Meta:
         model = User
@@ -199,7 +239,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(
         source='recipe_ingredients', many=True, read_only=True
     )
-    tags = TagSerializer(many=True, read_only=True)
+    tags = serializers.SerializerMethodField()
     author = UserSerializer(read_only=True)
     image = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
@@ -219,28 +259,40 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_favorited',
             'is_in_shopping_cart',
         )
+        list_serializer_class = ViewerListSerializer
 
     def get_image(self, obj):
-        """Получение изображения."""
-        request = self.context.get('request')
-        if obj.image:
-            url = obj.image.url
-            return request.build_absolute_uri(url) if request else url
-        return ''
+        """Изображение или его копия из контекста image_variant."""
+        if not obj.image:
+            return ''
+        return get_image_url(
+            self.context.get('request'), obj.image, obj.image_variants,
+            self.context.get('image_variant')
+        )
+
+    def get_tags(self, obj):
+        """Теги рецепта из снимка тегов, один снимок на сериализацию."""
+        registry = self.context.get('tag_registry')
+        if registry is None:
+            registry = self.context['tag_registry'] = get_tag_registry()
+        tags = registry.get_tags(
+            recipe_tag.tag_id for recipe_tag in obj.recipe_tags.all()
+        )
+        return TagSerializer(tags, many=True).data
+
+    def expect_viewer_state(self, state, recipes):
+        recipe_ids = [recipe.pk for recipe in recipes]
+        state.expect('favorites', recipe_ids)
+        state.expect('purchases', recipe_ids)
+        state.expect('subscriptions', [recipe.author_id for recipe in recipes])
 
     def get_is_favorited(self, obj):
         """Проверка, добавлен ли рецепт в избранное текущего пользователя."""
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.favorites.filter(recipe=obj).exists()
+        return get_viewer_state(self.context).has('favorites', obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
         """Проверка, добавлен ли рецепт в список покупок пользователя."""
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.purchases.filter(recipe=obj).exists()
+        return get_viewer_state(self.context).has('purchases', obj.pk)
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -250,7 +302,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all()
     )
-    image = Base64ImageField(required=True)
+    image = ImageUploadField(required=True)
     cooking_time = serializers.IntegerField(
         min_value=MIN_COOKING_TIME,
         max_value=MAX_COOKING_TIME,
@@ -319,6 +371,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             recipe = Recipe.objects.create(author=author, **validated_data)
             recipe.tags.set(tags)
             self.set_ingredients(recipe, ingredients_data)
+            Recipe.objects.filter(pk=recipe.pk).update_search_vector()
 
         return recipe
 
@@ -330,23 +383,43 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
 
         with transaction.atomic():
-            instance.save()
+            instance.save(update_fields=[*validated_data, 'updated_at'])
 
             if ingredients_data is not None:
+                old_amounts = ShoppingCartTotal.objects.get_recipe_amounts(
+                    instance
+                )
                 instance.recipe_ingredients.all().delete()
                 self.set_ingredients(instance, ingredients_data)
+                ShoppingCartTotal.objects.update_recipe(instance, old_amounts)
 
             if tags is not None:
                 instance.tags.set(tags)
 
+            Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
         return instance
 
     def to_representation(self, instance):
+        instance = Recipe.objects.for_read().get(pk=instance.pk)
         return RecipeReadSerializer(
             instance, context=self.context
         ).data
 
 
+class CookableRecipeSerializer(RecipeReadSerializer):
+    """Рецепт с числом имеющихся и недостающих ингредиентов."""
+
+    covered_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'covered_count',
+            'missing_count',
+        )
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого отображения рецептов."""
 
@@ -357,9 +430,10 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
     def get_image(self, obj):
-        """Получение изображения."""
-        request = self.context.get('request')
-        if obj.image:
-            url = obj.image.url
-            return request.build_absolute_uri(url) if request else url
-        return ''
+        """Уменьшенная копия изображения."""
+        if not obj.image:
+            return ''
+        return get_image_url(
+            self.context.get('request'), obj.image, obj.image_variants,
+            'thumbnail'
+        )
@@ -0,0 +1,141 @@
+"""Выгрузка списка покупок в форматах txt, csv и pdf."""
+import csv
+import json
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+from recipes.models import ShoppingCartTotal
+
+SHOPPING_CART_TITLE = 'Список покупок'
+SHOPPING_CART_CHUNK_SIZE = 500
+
+
+def get_shopping_cart_rows(user):
+    """Итератор строк (название, единица, сумма) по списку покупок.
+
+    Итоги берутся из ShoppingCartTotal и на PostgreSQL читаются
+    серверным курсором порциями, поэтому весь список не загружается
+    в память.
+    """
+    rows = (
+        ShoppingCartTotal.objects
+        .filter(user=user)
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+        .values_list(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'total_amount',
+        )
+    )
+    return rows.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Сам список отдаётся потоком через stream(). Ответы с ошибками
+    RecipeViewSet рендерит JSONRenderer, render() - запасной вариант.
+    """
+
+    charset = 'utf-8'
+    filename = 'shopping_list'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок простым текстом."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield f'{SHOPPING_CART_TITLE}:\n\n'
+        for name, unit, amount in rows:
+            yield f'- {name} — {amount} {unit}\n'
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for name, unit, amount in rows:
+            yield writer.writerow((name, amount, unit))
+
+
+class PDFShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в PDF.
+
+    Таблица ссылок PDF пишется в конец документа, поэтому файл
+    собирается целиком и только затем отдаётся клиенту.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_CART_PDF_FONT)
+            )
+        return self.font_name
+
+    def stream(self, rows):
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle(SHOPPING_CART_TITLE)
+        font = self.get_font()
+        _, height = A4
+        line_height = self.font_size * 1.5
+
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, height - self.margin, SHOPPING_CART_TITLE)
+        y = height - self.margin - line_height * 2
+        pdf.setFont(font, self.font_size)
+        for name, unit, amount in rows:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(self.margin, y, f'- {name} — {amount} {unit}')
+            y -= line_height
+        pdf.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_CART_RENDERERS = (
+    TextShoppingCartRenderer,
+    CSVShoppingCartRenderer,
+    PDFShoppingCartRenderer,
+)
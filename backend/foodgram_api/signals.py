@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram_api.authentication import forget_token, forget_user
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    """Сбрасывает кэш удалённого токена, например после выхода."""
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(instance, created, update_fields=None, **kwargs):
+    """Сбрасывает кэш токенов изменённого или деактивированного пользователя.
+
+    Обновление last_login при входе на аутентификацию не влияет.
+    """
+    if created or (
+        update_fields is not None and set(update_fields) == {'last_login'}
+    ):
+        return
+    forget_user(instance)
@@ -0,0 +1,309 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image():
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4)).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), 'image.png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class APITestCase(TestCase):
+    """Общие данные: пользователи, теги, ингредиенты и рецепты."""
+
+    recipes_count = 8
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{index}@example.com',
+                username=f'user{index}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='Password12345!',
+            )
+            for index in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(5)
+        ]
+        for index in range(cls.recipes_count):
+            recipe = Recipe(
+                author=cls.users[index % len(cls.users)],
+                name=f'Рецепт {index}',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.image.save('image.png', make_image(), save=False)
+            recipe.save()
+            recipe.tags.set(cls.tags[:1 + index % len(cls.tags)])
+            for position in range(3):
+                RecipeIngredient.objects.create(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[
+                        (index + position) % len(cls.ingredients)
+                    ],
+                    amount=position + 1,
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+
+    def get_client(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+
+class RecipeListQueryCountTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def assertListQueries(self, client, count):
+        # Прогревает снимок тегов и кэш токена.
+        client.get('/api/tags/')
+        for limit in (2, self.recipes_count):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(count):
+                    response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assertListQueries(self.anonymous, 5)
+
+    def test_authenticated(self):
+        user = self.users[0]
+        client = self.get_client(user)
+        client.post(f'/api/recipes/{Recipe.objects.first().pk}/favorite/')
+        self.assertListQueries(client, 8)
+
+
+class RecipeCursorPaginationTest(APITestCase):
+
+    def test_cursor(self):
+        response = self.anonymous.get('/api/recipes/?cursor=&limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertIn('cursor=', response.data['next'])
+
+    def test_search_falls_back_to_pages(self):
+        response = self.anonymous.get(
+            '/api/recipes/', {'cursor': '', 'search': 'Рецепт 1'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Рецепт 1')
+
+
+class SubscriptionsTest(APITestCase):
+
+    def test_recipes_preview(self):
+        client = self.get_client(self.users[0])
+        client.post(f'/api/users/{self.users[1].pk}/subscribe/')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                '/api/users/subscriptions/', {'recipes_limit': 1}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results'][0]['recipes']), 1)
+        recipes_sql = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "recipes_recipe"' in query['sql']
+        ]
+        self.assertTrue(recipes_sql)
+        for sql in recipes_sql:
+            self.assertNotIn('search_vector', sql)
+            self.assertNotIn('"text"', sql)
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0)
+class AvatarUploadTest(APITestCase):
+
+    def test_undecodable_image(self):
+        user = self.users[0]
+        client = self.get_client(user)
+        upload = SimpleUploadedFile(
+            'avatar.png', b'\x89PNG\r\n\x1a\n' + os.urandom(512),
+            content_type='image/png',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.put(
+                '/api/users/me/avatar/', {'avatar': upload},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertEqual(user.avatar_variants['source'], user.avatar.name)
+        self.assertIn('error', user.avatar_variants)
+        self.assertTrue(user.avatar.storage.exists(user.avatar.name))
+
+
+class FavoriteTest(APITestCase):
+
+    def test_favorites_count(self):
+        client = self.get_client(self.users[0])
+        recipe = Recipe.objects.first()
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+        self.assertEqual(client.post(url).status_code, 201)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(client.delete(url).status_code, 204)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+
+class TokenAuthenticationTest(APITestCase):
+
+    def test_cached_token_skips_database(self):
+        client = self.get_client(self.users[0])
+        client.get('/api/users/me/')
+        # Единственный запрос - подписки для is_subscribed.
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/users/me/').status_code, 200)
+
+    def test_logout_forgets_token(self):
+        client = self.get_client(self.users[0])
+        client.get('/api/users/me/')
+        response = client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+    def test_counters_survive_cached_user_save(self):
+        user = self.users[0]
+        client = self.get_client(user)
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        self.get_client(self.users[1]).post(
+            f'/api/users/{user.pk}/subscribe/'
+        )
+        response = client.post('/api/users/set_password/', {
+            'current_password': 'Password12345!',
+            'new_password': 'NewPassword12345!',
+        })
+        self.assertEqual(response.status_code, 204)
+        user.refresh_from_db()
+        self.assertEqual(user.followers_count, 1)
+        self.assertTrue(user.check_password('NewPassword12345!'))
+
+    def test_inactive_user_is_rejected(self):
+        user = self.users[0]
+        client = self.get_client(user)
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+
+class RecipeETagTest(APITestCase):
+
+    def test_etag_depends_on_user(self):
+        first = self.anonymous.get('/api/recipes/')['ETag']
+        second = self.get_client(self.users[0]).get('/api/recipes/')['ETag']
+        third = self.get_client(self.users[1]).get('/api/recipes/')['ETag']
+        self.assertEqual(len({first, second, third}), 3)
+
+    def test_etag_changes_after_cache_reset(self):
+        etag = self.anonymous.get('/api/recipes/')['ETag']
+        cache.clear()
+        response = self.anonymous.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_page_skips_database(self):
+        self.anonymous.get('/api/recipes/?cursor=')
+        with self.assertNumQueries(0):
+            response = self.anonymous.get('/api/recipes/?cursor=')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.anonymous.get(
+                '/api/recipes/?cursor=', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsTest(APITestCase):
+
+    def test_server_timing(self):
+        response = APIClient().get('/api/recipes/')
+        timings = {
+            part.split(';')[0].strip(): part
+            for part in response['Server-Timing'].split(',')
+        }
+        self.assertEqual(set(timings), {'db', 'app', 'render', 'total'})
+
+
+class ShoppingCartDownloadTest(APITestCase):
+
+    def test_empty_cart_error_is_json(self):
+        client = self.get_client(self.users[0])
+        for format in ('txt', 'csv', 'pdf'):
+            with self.subTest(format=format):
+                response = client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    {'format': format},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('error', response.json())
+
+    def test_other_errors_are_json(self):
+        cases = (
+            (self.anonymous, {'format': 'pdf'}, 401),
+            (self.get_client(self.users[0]), {'format': 'xml'}, 404),
+        )
+        for client, params, status_code in cases:
+            with self.subTest(params=params, status_code=status_code):
+                response = client.get(
+                    '/api/recipes/download_shopping_cart/', params
+                )
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('detail', response.json())
+
+    def test_download(self):
+        client = self.get_client(self.users[0])
+        recipe = Recipe.objects.first()
+        client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        response = client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'csv'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        content = b''.join(response.streaming_content).decode()
+        for recipe_ingredient in recipe.recipe_ingredients.all():
+            self.assertIn(recipe_ingredient.ingredient.name, content)
@@ -0,0 +1,54 @@
+"""Загрузка изображений файлом в multipart/form-data."""
+import filetype
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+FILE_HEADER_SIZE = 261
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файлы сразу во временный файл и ограничивает их размер.
+
+    Файл больше IMAGE_UPLOAD_MAX_SIZE прерывает разбор запроса,
+    DRF отвечает на это 400 Bad Request.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.file.close()
+            raise MultiPartParserError(
+                f'файл больше {settings.IMAGE_UPLOAD_MAX_SIZE} байт'
+            )
+        return super().receive_data_chunk(raw_data, start)
+
+
+class ImageUploadField(Base64ImageField):
+    """Изображение строкой base64 или файлом из multipart/form-data.
+
+    Файл из multipart не декодируется в запросе: тип определяется
+    по заголовку через filetype, а уменьшенные копии строятся потом.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        data.seek(0)
+        kind = filetype.guess(data.read(FILE_HEADER_SIZE))
+        data.seek(0)
+        if kind is None:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if kind.extension == 'jpeg' else kind.extension
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        data.name = f'{self.get_file_name(data)}.{extension}'
+        data.content_type = kind.mime
+        return data
@@ -0,0 +1,79 @@
+"""Избранное, список покупок и подписки текущего пользователя.
+
+Состояние создаётся одно на запрос и общее для всех сериализаторов,
+поэтому персональные поля любой страницы с рецептами и пользователями,
+включая вложенных авторов, стоят не больше одного запроса на вид связи.
+"""
+from django.db import models
+from rest_framework import serializers
+
+from recipes.models import Favorite, Purchase
+from users.models import Subscription
+
+RELATIONS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'purchases': (Purchase, 'recipe_id'),
+    'subscriptions': (Subscription, 'author_id'),
+}
+
+
+class ViewerState:
+    """Связи пользователя с рецептами и авторами в рамках запроса.
+
+    Сериализаторы списков заранее сообщают id объектов страницы через
+    expect(), и первый вопрос о любом из них загружает ответ для всех
+    ожидаемых id одним запросом. Проверенные id повторно
+    не запрашиваются.
+    """
+
+    def __init__(self, user):
+        if user is not None and not user.is_authenticated:
+            user = None
+        self.user = user
+        self.pending = {relation: set() for relation in RELATIONS}
+        self.checked = {relation: set() for relation in RELATIONS}
+        self.found = {relation: set() for relation in RELATIONS}
+
+    def expect(self, relation, ids):
+        if self.user is not None:
+            self.pending[relation].update(ids)
+
+    def has(self, relation, pk):
+        if self.user is None:
+            return False
+        if pk not in self.checked[relation]:
+            ids = (self.pending[relation] | {pk}) - self.checked[relation]
+            self.pending[relation].clear()
+            model, field = RELATIONS[relation]
+            self.found[relation].update(
+                model.objects
+                .filter(user=self.user, **{f'{field}__in': ids})
+                .order_by()
+                .values_list(field, flat=True)
+            )
+            self.checked[relation].update(ids)
+        return pk in self.found[relation]
+
+
+def get_viewer_state(context):
+    """ViewerState запроса из контекста сериализатора."""
+    request = context.get('request')
+    if request is None:
+        return ViewerState(None)
+    state = getattr(request, '_viewer_state', None)
+    if state is None or state.user != (
+        request.user if request.user.is_authenticated else None
+    ):
+        state = request._viewer_state = ViewerState(request.user)
+    return state
+
+
+class ViewerListSerializer(serializers.ListSerializer):
+    """Сообщает состоянию пользователя id всех объектов страницы."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        data = list(data)
+        self.child.expect_viewer_state(get_viewer_state(self.context), data)
+        return super().to_representation(data)
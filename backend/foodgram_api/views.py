@@ -1,17 +1,29 @@
-from django.db.models import Sum
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, Value
 from djoser.views import UserViewSet as DjoserUserViewSet
-from django.http import HttpResponse
+from django.http import (
+    Http404, HttpResponseRedirect, StreamingHttpResponse
+)
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
 from http import HTTPStatus
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (
     AllowAny, IsAuthenticated,
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from foodgram_api.serializers import (
     AvatarSerializer,
+    CookableRecipeSerializer,
     IngredientSerializer,
     SetPasswordSerializer,
     TagSerializer,
@@ -22,9 +34,24 @@ from foodgram_api.serializers import (
     ShortRecipeSerializer,
 )
 from foodgram_api.filters import RecipeFilter, IngredientFilter
+from foodgram_api.cache import (
+    cache_anonymous_response, conditional_response, get_request_digest
+)
+from foodgram_api.pagination import LimitPagination, RecipePagination
 from foodgram_api.permissions import IsAuthorOrReadOnly
+from foodgram_api.shopping_cart import (
+    SHOPPING_CART_RENDERERS, get_shopping_cart_rows
+)
+from recipes import short_links
+from recipes.catalogue import get_catalogue
 from recipes.models import (
-    Ingredient, Tag, Recipe, Purchase, Favorite, RecipeIngredient
+    Ingredient, Tag, Recipe, RecipeIngredient, Purchase, Favorite,
+    ShoppingCartTotal, TimelineEntry
+)
+from recipes.tags import get_tag_registry
+from recipes.versions import (
+    INGREDIENTS_VERSION, POPULARITY_VERSION, RECIPES_VERSION, TAGS_VERSION,
+    USERS_VERSION, get_versions, get_viewer_version_key
 )
 from users.models import User, Subscription
 
@@ -86,9 +113,29 @@ class UserViewSet(DjoserUserViewSet):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         if user.avatar:
-            user.avatar.delete(save=True)
+            user.avatar = None
+            user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_subscriptions_queryset(self):
+        """Авторы с recipes_limit последними рецептами.
+
+        Последние рецепты всех авторов страницы подгружаются одним
+        запросом с ROW_NUMBER() по автору, только с полями,
+        нужными ShortRecipeSerializer.
+        """
+        recipes = Recipe.objects.only(
+            "id", "author", "name", "image", "image_variants", "cooking_time"
+        )
+        limit = self.request.query_params.get("recipes_limit")
+        if limit and limit.isdigit():
+            recipes = recipes[:int(limit)]
+        return User.objects.annotate(
+            is_subscribed=Value(True),
+        ).order_by("username").prefetch_related(
+            Prefetch("recipes", queryset=recipes, to_attr="recipes_preview")
+        )
+
     @action(
         methods=["get"],
         detail=False,
@@ -97,7 +144,9 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        authors = User.objects.filter(following__user=user)
+        authors = self.get_subscriptions_queryset().filter(
+            following__user=user
+        )
 
         page = self.paginate_queryset(authors)
         serializer = SubscriptionSerializer(
@@ -135,14 +184,19 @@ class UserViewSet(DjoserUserViewSet):
                     status=HTTPStatus.BAD_REQUEST
                 )
 
-            Subscription.objects.create(user=user, author=author)
+            with transaction.atomic():
+                Subscription.objects.create(user=user, author=author)
+                TimelineEntry.objects.follow(user, author)
             serializer = SubscriptionSerializer(
-                author,
+                self.get_subscriptions_queryset().get(pk=author.pk),
                 context={"request": request}
             )
             return Response(serializer.data, status=HTTPStatus.CREATED)
 
-        deleted_count = user.follower.filter(author=author).delete()[0]
+        with transaction.atomic():
+            deleted_count = user.follower.filter(author=author).delete()[0]
+            if deleted_count:
+                TimelineEntry.objects.unfollow(user, author)
 
         if deleted_count == 0:
             return Response(
@@ -154,13 +208,42 @@ class UserViewSet(DjoserUserViewSet):
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet для работы с тегами."""
+    """ViewSet для работы с тегами.
+
+    Теги отдаются из снимка в памяти процесса (recipes.tags) без
+    запросов к базе.
+    """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def get_queryset(self):
+        return get_tag_registry().tags
+
+    def get_object(self):
+        pk = self.kwargs[self.lookup_field]
+        tag = None
+        if str(pk).isdecimal():
+            tag = get_tag_registry().tags_by_id.get(int(pk))
+        if tag is None:
+            raise Http404
+        return tag
+
+    def get_etag(self, request, *args, **kwargs):
+        return get_request_digest(
+            request, *get_versions(TAGS_VERSION), *kwargs.values()
+        )
+
+    @conditional_response('get_etag')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response('get_etag')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet для работы с ингредиентами."""
@@ -173,6 +256,41 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     filter_backends = (DjangoFilterBackend,)
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and self.request.query_params.get('name'):
+            return queryset[:settings.INGREDIENT_SEARCH_LIMIT]
+        return queryset
+
+    def get_etag(self, request, *args, **kwargs):
+        return get_request_digest(
+            request, *get_versions(INGREDIENTS_VERSION), *kwargs.values()
+        )
+
+    @conditional_response('get_etag')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @conditional_response('get_etag')
+    def list(self, request, *args, **kwargs):
+        """Список ингредиентов.
+
+        При INGREDIENT_CATALOGUE_IN_MEMORY поиск по началу названия
+        обслуживается снимком справочника в памяти без запросов к базе.
+        """
+        mode = request.query_params.get('mode') or 'prefix'
+        if not settings.INGREDIENT_CATALOGUE_IN_MEMORY or mode != 'prefix':
+            return super().list(request, *args, **kwargs)
+
+        catalogue = get_catalogue()
+        name = request.query_params.get('name')
+        if name:
+            rows = catalogue.search(name, settings.INGREDIENT_SEARCH_LIMIT)
+        else:
+            rows = catalogue.rows
+        fields = IngredientSerializer.Meta.fields
+        return Response([dict(zip(fields, row)) for row in rows])
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """ViewSet для работы с рецептами."""
@@ -180,17 +298,90 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeReadSerializer
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = RecipePagination
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
+    cookable_ingredients_limit = 100
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.for_read()
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'cookable', 'feed'):
+            context['image_variant'] = 'card'
+        return context
+
+    def get_versions(self, request, *keys):
+        """Версии данных и, для пользователя, версия его персональных полей."""
+        if request.user.is_authenticated:
+            keys += (get_viewer_version_key(request.user.pk),)
+        return get_versions(*keys)
+
+    def get_list_versions(self, request, *args, **kwargs):
+        keys = (RECIPES_VERSION, INGREDIENTS_VERSION)
+        if request.query_params.get('ordering'):
+            keys += (POPULARITY_VERSION,)
+        return self.get_versions(request, *keys)
+
+    def get_detail_versions(self, request, *args, **kwargs):
+        return self.get_versions(request, RECIPES_VERSION, INGREDIENTS_VERSION)
+
+    def get_list_etag(self, request, *args, **kwargs):
+        """ETag списка по версиям данных и пользователю, без запросов к БД.
+
+        Вытесненная из кэша версия заводится заново уникальным
+        значением (см. recipes.versions), поэтому ETag не повторяется.
+        """
+        return get_request_digest(
+            request, request.user.pk, *self.get_list_versions(request)
+        )
+
+    def get_detail_etag(self, request, pk=None):
+        if not str(pk).isdigit():
+            return None
+        updated_at = (
+            Recipe.objects.filter(pk=pk)
+            .values_list('updated_at', flat=True).first()
+        )
+        if updated_at is None:
+            return None
+        return get_request_digest(
+            request,
+            request.user.pk,
+            pk,
+            updated_at.isoformat(),
+            *self.get_versions(
+                request, TAGS_VERSION, INGREDIENTS_VERSION, USERS_VERSION
+            )
+        )
+
+    @conditional_response('get_list_etag')
+    @cache_anonymous_response('recipes:list', 'get_list_versions')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response('get_detail_etag')
+    @cache_anonymous_response('recipes:detail', 'get_detail_versions')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save()
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingCartTotal.objects.discard_recipe(instance)
+        instance.delete()
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -237,60 +428,170 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     {"errors": "Рецепт уже в списке покупок"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Purchase.objects.create(user=user, recipe=recipe)
+            with transaction.atomic():
+                Purchase.objects.create(user=user, recipe=recipe)
+                ShoppingCartTotal.objects.add_recipe(user, recipe)
             serializer = ShortRecipeSerializer(
                 recipe,
                 context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if request.method == 'DELETE':
-            purchase = user.purchases.filter(recipe=recipe)
-            if purchase.exists():
-                purchase.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            deleted_count = user.purchases.filter(recipe=recipe).delete()[0]
+            if deleted_count:
+                ShoppingCartTotal.objects.remove_recipe(user, recipe)
+        if deleted_count == 0:
             return Response(
                 {"errors": "Рецепт не в списке покупок"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_cookable_params(self, request):
+        ingredient_ids = set()
+        for value in request.query_params.getlist('ingredients'):
+            for item in value.split(','):
+                if not item.strip().isdecimal():
+                    raise ValidationError(
+                        {'ingredients': 'Ожидаются id ингредиентов.'}
+                    )
+                ingredient_ids.add(int(item))
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент.'}
+            )
+        if len(ingredient_ids) > self.cookable_ingredients_limit:
+            raise ValidationError({
+                'ingredients': 'Можно указать не больше '
+                f'{self.cookable_ingredients_limit} ингредиентов.'
+            })
+        max_missing = request.query_params.get('max_missing')
+        if max_missing is not None and not max_missing.isdecimal():
+            raise ValidationError(
+                {'max_missing': 'Ожидается неотрицательное число.'}
+            )
+        return ingredient_ids, max_missing
 
     @action(
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated],
-        url_path='download_shopping_cart'
+        url_path='feed',
     )
-    def download_shopping_cart(self, request):
-        """Скачивание списка покупок пользователя."""
-        user = request.user
-        purchases = user.purchases.select_related('recipe')
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        Страница выбирается по курсору из ленты подписок и рецептов
+        популярных авторов (см. TimelineEntryManager), затем
+        загружаются только рецепты страницы.
+        """
+        paginator = RecipePagination()
+        keys = paginator.paginate_keyset(
+            request,
+            lambda position, limit: TimelineEntry.objects.get_feed(
+                request.user, position, limit
+            ),
+            lambda key: key,
+        )
+        recipes = Recipe.objects.for_read().in_bulk(
+            [pk for pub_date, pk in keys]
+        )
+        serializer = RecipeReadSerializer(
+            [recipes[pk] for pub_date, pk in keys if pk in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return paginator.get_paginated_response(serializer.data)
 
-        if not purchases.exists():
-            return Response(
-                {"error": "Список покупок пуст"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='cookable',
+    )
+    def cookable(self, request):
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов.
+
+        Ингредиенты передаются параметром ingredients (id через запятую
+        или повтором параметра), max_missing ограничивает число
+        недостающих. Покрытие считается одним сгруппированным запросом
+        по ингредиентам рецептов, затем загружается только страница.
+        """
+        ingredient_ids, max_missing = self.get_cookable_params(request)
+        coverage = RecipeIngredient.objects.coverage(ingredient_ids)
+        if max_missing is not None:
+            coverage = coverage.filter(missing__lte=int(max_missing))
+
+        paginator = LimitPagination()
+        page = paginator.paginate_queryset(coverage, request, view=self)
+        recipes = Recipe.objects.for_read().in_bulk(
+            [row['recipe'] for row in page]
+        )
+        results = []
+        for row in page:
+            recipe = recipes.get(row['recipe'])
+            if recipe is None:
+                continue
+            recipe.covered_count = row['covered']
+            recipe.missing_count = row['missing']
+            results.append(recipe)
+        serializer = CookableRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
 
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__purchased_by__user=user)
-            .values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
-            )
-            .annotate(total_amount=Sum('amount'))
-            .order_by('ingredient__name')
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Ошибки скачивания списка покупок отдаются в JSON.
+
+        Иначе их отрендерил бы рендерер списка покупок с его
+        Content-Type, а для неизвестного формата - первый из них.
+        """
+        response = super().finalize_response(
+            request, response, *args, **kwargs
         )
+        if (
+            self.action == 'download_shopping_cart'
+            and isinstance(response, Response)
+            and response.status_code >= status.HTTP_400_BAD_REQUEST
+        ):
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+        return response
 
-        lines = ["Список покупок:\n"]
-        for item in ingredients:
-            lines.append(
-                f"- {item['ingredient__name']} — {item['total_amount']}"
-                f"{item['ingredient__measurement_unit']}"
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='download_shopping_cart',
+        renderer_classes=SHOPPING_CART_RENDERERS,
+    )
+    def download_shopping_cart(self, request):
+        """Скачивание списка покупок пользователя.
+
+        Формат выбирается параметром ?format=txt|csv|pdf. Ошибки,
+        включая пустой список, отдаются в JSON независимо от формата
+        (см. finalize_response).
+        """
+        rows = get_shopping_cart_rows(request.user)
+        first_row = next(rows, None)
+        if first_row is None:
+            return Response(
+                {"error": "Список покупок пуст"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        response_text = "\n".join(lines)
-        return HttpResponse(response_text, content_type='text/plain')
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(chain((first_row,), rows)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.get_filename()}"'
+        )
+        return response
 
     @action(
         detail=True,
@@ -300,10 +601,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, pk=None):
         """Возвращает короткую ссылку на рецепт."""
-
-        short_link = request.build_absolute_uri(f"/recipes/{pk}/")
+        if not str(pk).isdigit() or not short_links.recipe_exists(int(pk)):
+            raise Http404
+        short_link = request.build_absolute_uri(
+            reverse('short-link', args=(short_links.encode(int(pk)),))
+        )
 
         return Response(
             {"short_link": short_link},
             status=status.HTTP_200_OK
         )
+
+
+@require_safe
+def short_link_redirect(request, code):
+    """Переход по короткой ссылке на страницу рецепта."""
+    pk = short_links.decode(code)
+    if pk is None or not short_links.recipe_exists(pk):
+        raise Http404
+    response = HttpResponseRedirect(f'/recipes/{pk}/')
+    patch_cache_control(
+        response, public=True, max_age=settings.SHORT_LINK_CACHE_TIMEOUT
+    )
+    return response
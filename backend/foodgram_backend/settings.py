@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -38,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram_api.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,9 +83,21 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+ANONYMOUS_RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'foodgram_api.authentication.CachingTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -142,4 +157,61 @@ STATIC_ROOT = '/app/staticfiles/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media/'
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'recipes.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+SHORT_LINK_CACHE_TIMEOUT = 60 * 60 * 24
+
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 5000))
+
+FEED_BACKFILL_LIMIT = 100
+
+REQUEST_METRICS_ENABLED = os.getenv(
+    'REQUEST_METRICS_ENABLED', 'False'
+).lower() == 'true'
+
+REQUEST_QUERY_BUDGET = 20
+
+REQUEST_LATENCY_BUDGET = 0.5
+
+INGREDIENT_CATALOGUE_IN_MEMORY = os.getenv(
+    'INGREDIENT_CATALOGUE_IN_MEMORY', 'False'
+).lower() == 'true'
+
+FILE_UPLOAD_HANDLERS = [
+    'foodgram_api.uploads.LimitedTemporaryFileUploadHandler',
+]
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+)
+
+IMAGE_VARIANTS = {
+    'thumbnail': (200, 200),
+    'card': (640, 640),
+}
+
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'WEBP').upper()
+
+IMAGE_VARIANT_QUALITY = 80
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+IMAGE_GC_GRACE_PERIOD = timedelta(hours=1)
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
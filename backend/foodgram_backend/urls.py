@@ -1,7 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from foodgram_api.metrics import metrics_view
+from foodgram_api.views import short_link_redirect
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('foodgram_api.urls')),
+    path('s/<str:code>', short_link_redirect, name='short-link'),
+    path('metrics', metrics_view, name='metrics'),
 ]
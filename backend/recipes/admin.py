@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from recipes.models import (
-    Favorite, Ingredient, Purchase, Recipe, RecipeIngredient, Tag
+    Favorite, Ingredient, Purchase, Recipe, RecipeIngredient, RecipeTag,
+    ShoppingCartTotal, Tag
 )
 
 
@@ -27,16 +28,40 @@ class IngredientAmountInline(admin.TabularInline):
     extra = 1
 
 
+class RecipeTagInline(admin.TabularInline):
+    model = RecipeTag
+    extra = 1
+
+
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'pub_date', 'favorites_count')
+    list_display = (
+        'name', 'author', 'pub_date', 'favorites_count', 'purchases_count'
+    )
     search_fields = ('name', 'author__username', 'tags__name')
     list_filter = ('tags', 'author')
-    inlines = (IngredientAmountInline,)
-
-    def favorites_count(self, obj):
-        return obj.favorited_by.count()
-    favorites_count.short_description = 'Количество в избранном'
+    readonly_fields = ('favorites_count', 'purchases_count')
+    inlines = (RecipeTagInline, IngredientAmountInline)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(pk=form.instance.pk).update_search_vector()
+        ShoppingCartTotal.objects.rebuild(
+            ShoppingCartTotal.objects.get_purchaser_ids(form.instance)
+        )
+
+    def delete_model(self, request, obj):
+        user_ids = ShoppingCartTotal.objects.get_purchaser_ids(obj)
+        super().delete_model(request, obj)
+        ShoppingCartTotal.objects.rebuild(user_ids)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(
+            Purchase.objects.filter(recipe__in=queryset)
+            .values_list('user_id', flat=True).distinct()
+        )
+        super().delete_queryset(request, queryset)
+        ShoppingCartTotal.objects.rebuild(user_ids)
 
 
 @admin.register(Purchase)
@@ -47,6 +72,31 @@ class PurchaseAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'recipe__name')
     list_filter = ('user', 'recipe')
 
+    def save_model(self, request, obj, form, change):
+        user_ids = {obj.user_id}
+        if change:
+            user_ids.add(form.initial['user'])
+        super().save_model(request, obj, form, change)
+        ShoppingCartTotal.objects.rebuild(user_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ShoppingCartTotal.objects.rebuild([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        ShoppingCartTotal.objects.rebuild(user_ids)
+
+
+@admin.register(ShoppingCartTotal)
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    """Админка для модели ShoppingCartTotal."""
+
+    list_display = ('id', 'user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
+    readonly_fields = ('user', 'ingredient', 'total_amount')
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
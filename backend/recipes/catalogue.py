@@ -0,0 +1,66 @@
+"""Справочник ингредиентов в памяти процесса.
+
+Снимок справочника загружается при первом обращении и живёт, пока
+не изменится версия в кэше. Версию увеличивают сигналы модели
+Ingredient и команда load_ingredients.
+"""
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS_VERSION, bump_version, get_version
+
+_catalogue = None
+_catalogue_lock = Lock()
+
+
+class IngredientCatalogue:
+    """Неизменяемый снимок ингредиентов для поиска по началу названия.
+
+    Строки (id, name, measurement_unit) отсортированы по названию
+    в casefold, поэтому поиск по префиксу - это два bisect.
+    """
+
+    __slots__ = ('version', 'keys', 'rows')
+
+    def __init__(self, version, rows):
+        entries = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        self.version = version
+        self.keys = tuple(entry[0] for entry in entries)
+        self.rows = tuple(entry[1:] for entry in entries)
+
+    def search(self, prefix, limit=None):
+        """Возвращает строки, название которых начинается с prefix."""
+        key = prefix.casefold()
+        start = bisect_left(self.keys, key)
+        end = bisect_left(self.keys, key + chr(0x10FFFF), lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.rows[start:end]
+
+
+def bump_catalogue_version():
+    """Помечает снимки справочника во всех процессах устаревшими."""
+    bump_version(INGREDIENTS_VERSION)
+
+
+def get_catalogue():
+    """Возвращает актуальный снимок справочника, при необходимости
+    перечитывая его из базы."""
+    global _catalogue
+    version = get_version(INGREDIENTS_VERSION)
+    catalogue = _catalogue
+    if catalogue is None or catalogue.version != version:
+        with _catalogue_lock:
+            if _catalogue is None or _catalogue.version != version:
+                _catalogue = IngredientCatalogue(
+                    version,
+                    Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit'
+                    ),
+                )
+            catalogue = _catalogue
+    return catalogue
@@ -0,0 +1,261 @@
+"""Уменьшенные копии изображений рецептов и аватаров.
+
+Оригинал сохраняется в запросе как есть, а копии размеров из
+IMAGE_VARIANTS строятся после коммита в пуле потоков процесса.
+Сведения о копиях хранятся в JSON-поле рядом с изображением:
+{'source': имя оригинала, 'thumbnail': имя копии, ...}. Если оригинал
+не удалось декодировать, вместо копий записывается
+{'source': имя оригинала, 'error': описание}, и такой файл больше
+не обрабатывается. Копии, не построенные из-за перезапуска процесса,
+достраивает команда build_image_variants.
+
+Одинаковые файлы хранятся один раз (см. recipes.storage), поэтому
+файл удаляется, только когда на него не ссылается ни одна запись.
+Пропущенные так файлы удаляет команда collect_image_garbage.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.versions import RECIPES_VERSION, USERS_VERSION, bump_version
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = (
+    ('recipes.Recipe', 'image', 'image_variants'),
+    (settings.AUTH_USER_MODEL, 'avatar', 'avatar_variants'),
+)
+
+VARIANT_EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix='image-variants',
+            )
+    return _executor
+
+
+def get_variant_name(name, variant):
+    """Имя копии в каталоге variants рядом с каталогом загрузки."""
+    directory = name.split('/', 1)[0]
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    extension = VARIANT_EXTENSIONS[settings.IMAGE_VARIANT_FORMAT]
+    return posixpath.join(
+        directory, 'variants', f'{stem}_{variant}.{extension}'
+    )
+
+
+def get_variant(field_file, variants, variant):
+    """Имя копии, если она построена из текущего файла, иначе оригинала."""
+    if variant and variants.get('source') == field_file.name:
+        return variants.get(variant, field_file.name)
+    return field_file.name
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    if settings.IMAGE_VARIANT_FORMAT == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(
+        buffer,
+        settings.IMAGE_VARIANT_FORMAT,
+        quality=settings.IMAGE_VARIANT_QUALITY,
+    )
+    return buffer.getvalue()
+
+
+def build_variants(field_file):
+    """Сохраняет копии всех размеров и возвращает сведения о них.
+
+    Ошибка чтения из хранилища пробрасывается, а ошибка декодирования
+    записывается в сведения, чтобы файл не обрабатывался повторно.
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name) as file:
+        try:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image.load()
+        except (OSError, Image.DecompressionBombError) as error:
+            # В том числе UnidentifiedImageError и обрезанные файлы.
+            logger.warning(
+                'Cannot decode image %s: %s', field_file.name, error
+            )
+            return {'source': field_file.name, 'error': str(error)}
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    variants = {'source': field_file.name}
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        variants[variant] = storage.save(
+            get_variant_name(field_file.name, variant),
+            ContentFile(render_variant(image, size))
+        )
+    return variants
+
+
+def update_variants(label, pk, field, variants_field, name):
+    """Строит копии, если у объекта всё ещё то же изображение."""
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).only(field, variants_field).first()
+    if instance is None or getattr(instance, field).name != name:
+        return False
+    field_file = getattr(instance, field)
+    variants = build_variants(field_file)
+    updated = model.objects.filter(pk=pk, **{field: name}).update(
+        **{variants_field: variants}
+    )
+    if not updated:
+        return False
+    bump_version(RECIPES_VERSION)
+    bump_version(USERS_VERSION)
+    old_names = set(get_file_names(name, getattr(instance, variants_field)))
+    release_files(
+        field_file.storage, old_names - set(get_file_names(name, variants))
+    )
+    return True
+
+
+def _run_update_variants(*args):
+    try:
+        update_variants(*args)
+    except Exception:
+        logger.exception('Failed to build image variants for %s', args)
+    finally:
+        connections.close_all()
+
+
+def sync_variants(instance, field, variants_field):
+    """Планирует построение копий после изменения изображения.
+
+    При IMAGE_VARIANT_WORKERS = 0 копии строятся синхронно после
+    коммита.
+    """
+    field_file = getattr(instance, field)
+    variants = getattr(instance, variants_field)
+    if not field_file:
+        if variants:
+            type(instance).objects.filter(pk=instance.pk).update(
+                **{variants_field: {}}
+            )
+            setattr(instance, variants_field, {})
+        return
+    if variants.get('source') == field_file.name:
+        return
+
+    args = (
+        instance._meta.label, instance.pk, field, variants_field,
+        field_file.name,
+    )
+    if settings.IMAGE_VARIANT_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run_update_variants, *args)
+        )
+    else:
+        transaction.on_commit(lambda: update_variants(*args))
+
+
+def get_image_fields():
+    """Модели с изображениями: (модель, поле, поле с копиями)."""
+    return [
+        (apps.get_model(label), field, variants_field)
+        for label, field, variants_field in IMAGE_FIELDS
+    ]
+
+
+def get_file_names(name, variants):
+    """Имена оригинала и всех его копий."""
+    if not name:
+        return []
+    return [name] + [
+        variant_name for variant, variant_name in variants.items()
+        if variant not in ('source', 'error')
+    ]
+
+
+def is_referenced(name):
+    """Ссылается ли какая-нибудь запись на файл как на оригинал или копию.
+
+    На PostgreSQL копии ищутся оператором @>, который использует
+    GIN-индексы полей с копиями, а не перебирает таблицу.
+    """
+    for model, field, variants_field in get_image_fields():
+        vendor = connections[model.objects.db].vendor
+        references = Q(**{field: name})
+        for variant in settings.IMAGE_VARIANTS:
+            if vendor == 'postgresql':
+                references |= Q(
+                    **{f'{variants_field}__contains': {variant: name}}
+                )
+            else:
+                references |= Q(**{f'{variants_field}__{variant}': name})
+        if model.objects.filter(references).exists():
+            return True
+    return False
+
+
+def release_files(storage, names):
+    """Удаляет файлы, на которые больше никто не ссылается.
+
+    Недавно записанные файлы пропускаются: их может использовать
+    загрузка, которая ещё не закоммичена.
+    """
+    threshold = timezone.now() - settings.IMAGE_GC_GRACE_PERIOD
+    for name in names:
+        if is_referenced(name) or not storage.exists(name):
+            continue
+        if storage.get_modified_time(name) > threshold:
+            continue
+        storage.delete(name)
+
+
+def remember_replaced_files(instance, field, variants_field, update_fields):
+    """Запоминает файлы, которые освободятся после сохранения объекта."""
+    if instance.pk is None or (
+        update_fields is not None and field not in update_fields
+    ):
+        return
+    stored = type(instance).objects.filter(pk=instance.pk).values_list(
+        field, variants_field
+    ).first()
+    if stored is None or stored[0] == getattr(instance, field).name:
+        return
+    instance._replaced_files = get_file_names(*stored)
+
+
+def release_replaced_files(instance, field):
+    names = instance.__dict__.pop('_replaced_files', None)
+    if names:
+        storage = getattr(instance, field).storage
+        transaction.on_commit(lambda: release_files(storage, names))
+
+
+def release_deleted_files(instance, field, variants_field):
+    field_file = getattr(instance, field)
+    names = get_file_names(field_file.name, getattr(instance, variants_field))
+    if names:
+        transaction.on_commit(
+            lambda: release_files(field_file.storage, names)
+        )
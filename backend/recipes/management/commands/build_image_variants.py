@@ -0,0 +1,46 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import get_image_fields, update_variants
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Build missing resized variants of recipe images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild variants even if they are up to date'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, variants_field in get_image_fields():
+            built = failed = 0
+            rows = (
+                model.objects
+                .exclude(**{field: ''})
+                .exclude(**{f'{field}__isnull': True})
+                .values_list('pk', field, variants_field)
+                .iterator(chunk_size=500)
+            )
+            for pk, name, variants in rows:
+                if not options['force'] and variants.get('source') == name:
+                    continue
+                try:
+                    updated = update_variants(
+                        model._meta.label, pk, field, variants_field, name
+                    )
+                except Exception:
+                    logger.exception('Failed to build variants for %s', name)
+                    failed += 1
+                    continue
+                if updated:
+                    built += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}.{field}: built variants for {built} '
+                f'files, failed {failed}'
+            ))
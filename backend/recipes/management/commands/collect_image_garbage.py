@@ -0,0 +1,60 @@
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import get_file_names, get_image_fields
+
+
+def walk(storage, directory):
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = 'Delete image files that are not referenced by any record'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report orphaned files, do not delete them'
+        )
+
+    def handle(self, *args, **options):
+        referenced = set()
+        directories = set()
+        for model, field, variants_field in get_image_fields():
+            directories.add(model._meta.get_field(field).upload_to)
+            rows = (
+                model.objects
+                .values_list(field, variants_field)
+                .iterator(chunk_size=2000)
+            )
+            for name, variants in rows:
+                referenced.update(get_file_names(name, variants))
+
+        threshold = timezone.now() - settings.IMAGE_GC_GRACE_PERIOD
+        deleted = 0
+        for directory in sorted(directories):
+            for name in walk(default_storage, directory.rstrip('/')):
+                if name in referenced:
+                    continue
+                if default_storage.get_modified_time(name) > threshold:
+                    continue
+                if not options['dry_run']:
+                    default_storage.delete(name)
+                deleted += 1
+
+        action = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {deleted} orphaned files, '
+            f'{len(referenced)} files are referenced'
+        ))
@@ -1,8 +1,64 @@
 import csv
 import json
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.catalogue import bump_catalogue_version
 from recipes.models import Ingredient
 
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(file):
+    """Строки (название, единица); для неполных строк - None."""
+    for row in csv.reader(file):
+        if row:
+            yield (row[0], row[1]) if len(row) >= 2 else None
+
+
+def iter_json(file):
+    """Построчно разбирает JSON-массив объектов, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    opened = False
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not opened:
+                if buffer[pos] != '[':
+                    raise CommandError('JSON must contain an array')
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break
+            if (
+                isinstance(item, dict)
+                and 'name' in item and 'measurement_unit' in item
+            ):
+                yield item['name'], item['measurement_unit']
+            else:
+                yield None
+        if not chunk:
+            raise CommandError('Unexpected end of JSON file')
+
+
+READERS = {
+    'csv': iter_csv,
+    'json': iter_json,
+}
+
 
 class Command(BaseCommand):
     help = 'Load ingredients from JSON or CSV'
@@ -10,7 +66,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             '--format',
-            choices=['json', 'csv'],
+            choices=list(READERS),
             default='json',
             help='Input data format'
         )
@@ -21,28 +77,52 @@ class Command(BaseCommand):
             help='Path to file'
         )
 
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows per INSERT'
+        )
+
     def handle(self, *args, **options):
-        file_format = options['format']
-        path = options['path']
-
-        if file_format == 'json':
-            with open(path, encoding='utf-8') as f:
-                data = json.load(f)
-
-        else:  # CSV
-            with open(path, encoding='utf-8') as f:
-                reader = csv.reader(f)
-                data = [
-                    {'name': row[0], 'measurement_unit': row[1]}
-                    for row in reader
-                ]
-
-        count = 0
-        for item in data:
-            Ingredient.objects.get_or_create(
-                name=item['name'],
-                measurement_unit=item['measurement_unit']
-            )
-            count += 1
-
-        self.stdout.write(self.style.SUCCESS(f'Loaded {count} ingredients'))
+        reader = READERS[options['format']]
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be a positive number')
+        started = time.monotonic()
+        count_before = Ingredient.objects.count()
+
+        total = 0
+        invalid = 0
+        seen = set()
+        batch = []
+        with open(options['path'], encoding='utf-8') as f:
+            for row in reader(f):
+                total += 1
+                key = row and (str(row[0]).strip(), str(row[1]).strip())
+                if not key or not all(key):
+                    invalid += 1
+                    self.stderr.write(f'Skipped malformed row {total}')
+                    continue
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(
+                    Ingredient(name=key[0], measurement_unit=key[1])
+                )
+                if len(batch) >= batch_size:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
+                    )
+                    batch = []
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        bump_catalogue_version()
+
+        inserted = Ingredient.objects.count() - count_before
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {total} rows: inserted {inserted}, '
+            f'skipped {total - inserted - invalid}, '
+            f'malformed {invalid} in {elapsed:.2f}s '
+            f'({total / max(elapsed, 1e-6):.0f} rows/s)'
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify shopping cart totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare stored totals with purchases, do not write'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            ShoppingCartTotal.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {ShoppingCartTotal.objects.count()} totals'
+            ))
+            return
+
+        expected = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingCartTotal.objects.calculate()
+        }
+        mismatches = 0
+        for user_id, ingredient_id, total_amount in (
+            ShoppingCartTotal.objects
+            .values_list('user_id', 'ingredient_id', 'total_amount')
+            .iterator(chunk_size=2000)
+        ):
+            if expected.pop((user_id, ingredient_id), None) != total_amount:
+                mismatches += 1
+        mismatches += len(expected)
+
+        if mismatches:
+            raise CommandError(
+                f'Found {mismatches} mismatched totals, '
+                'run without --verify to rebuild'
+            )
+        self.stdout.write(self.style.SUCCESS('Totals are consistent'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild subscription feed timelines from subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Rebuild only the timeline of the user with this id'
+        )
+
+    def handle(self, *args, **options):
+        TimelineEntry.objects.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt timelines, {TimelineEntry.objects.count()} entries'
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Purchase, Recipe
+from users.models import Subscription, User
+
+
+def count_subquery(queryset, field):
+    """Число строк queryset, ссылающихся на внешнюю запись через field."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite.objects.all(), 'recipe'),
+    (Recipe, 'purchases_count', Purchase.objects.all(), 'recipe'),
+    (User, 'recipes_count', Recipe.objects.all(), 'author'),
+    (User, 'followers_count', Subscription.objects.all(), 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized favorite, purchase and recipe counters'
+
+    def handle(self, *args, **options):
+        for model, counter, queryset, field in COUNTERS:
+            actual = count_subquery(queryset, field)
+            with transaction.atomic():
+                stale = (
+                    model.objects
+                    .annotate(actual=actual)
+                    .exclude(**{counter: F('actual')})
+                    .values('pk')
+                )
+                fixed = model.objects.filter(pk__in=stale).update(
+                    **{counter: actual}
+                )
+            self.stdout.write(
+                f'{model.__name__}.{counter}: fixed {fixed} rows'
+            )
+        self.stdout.write(self.style.SUCCESS('Counters are reconciled'))
@@ -0,0 +1,111 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from recipes.models import Favorite, Purchase, Recipe
+from recipes.versions import POPULARITY_VERSION, bump_version
+
+EVENT_WEIGHTS = (
+    (Favorite, 1.0),
+    (Purchase, 0.5),
+)
+
+
+def has_recent_events(since):
+    """Условие: у рецепта есть события, учитываемые в рейтинге."""
+    condition = None
+    for model, _ in EVENT_WEIGHTS:
+        events = Exists(model.objects.filter(
+            recipe=OuterRef('pk'), created_at__gte=since
+        ))
+        condition = events if condition is None else condition | events
+    return condition
+
+
+def get_trending_scores(now, window, half_life):
+    """Считает рейтинг рецептов по добавлениям в избранное и покупки.
+
+    События группируются по часам, вклад каждого часа убывает вдвое
+    за half_life. События старше window не учитываются.
+    """
+    scores = defaultdict(float)
+    for model, weight in EVENT_WEIGHTS:
+        buckets = (
+            model.objects
+            .filter(created_at__gte=now - window)
+            .annotate(hour=TruncHour('created_at'))
+            .values_list('recipe_id', 'hour')
+            .annotate(events=Count('pk'))
+            .order_by()
+        )
+        for recipe_id, hour, events in buckets.iterator(chunk_size=2000):
+            age = max((now - hour) / half_life, 0)
+            scores[recipe_id] += weight * events * 0.5 ** age
+    return scores
+
+
+class Command(BaseCommand):
+    help = 'Recalculate time-decayed trending scores of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=14,
+            help='Only count events from the last N days'
+        )
+
+        parser.add_argument(
+            '--half-life-hours',
+            type=float,
+            default=48,
+            help='Hours after which an event weighs half as much'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes per UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        if options['window_days'] < 1 or options['half_life_hours'] <= 0:
+            raise CommandError('Window and half-life must be positive')
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be a positive number')
+        started = time.monotonic()
+        now = timezone.now()
+        window = timedelta(days=options['window_days'])
+        scores = get_trending_scores(
+            now, window, timedelta(hours=options['half_life_hours'])
+        )
+        recipes = [
+            Recipe(pk=pk, trending_score=round(score, 6))
+            for pk, score in scores.items()
+        ]
+        with transaction.atomic():
+            # Один UPDATE с подзапросом вместо списка id в NOT IN.
+            reset = (
+                Recipe.objects
+                .exclude(trending_score=0)
+                .exclude(has_recent_events(now - window))
+                .update(trending_score=0)
+            )
+            Recipe.objects.bulk_update(
+                recipes, ['trending_score'],
+                batch_size=options['batch_size']
+            )
+        bump_version(POPULARITY_VERSION)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {len(recipes)} recipes, reset {reset} '
+            f'in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,29 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from recipes.operations import PostgresRunSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shopping_cart_total'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        PostgresRunSQL(
+            sql=(
+                'CREATE INDEX ingredient_name_prefix_idx '
+                'ON recipes_ingredient (UPPER(name) text_pattern_ops);'
+            ),
+            reverse_sql='DROP INDEX ingredient_name_prefix_idx;',
+        ),
+        PostgresRunSQL(
+            sql=(
+                'CREATE INDEX ingredient_name_trgm_idx '
+                'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops);'
+            ),
+            reverse_sql='DROP INDEX ingredient_name_trgm_idx;',
+        ),
+    ]
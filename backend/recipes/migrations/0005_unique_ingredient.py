@@ -0,0 +1,76 @@
+# Generated by Django 5.1.1 on 2026-10-17 06:45
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+MAX_INGREDIENT_AMOUNT = 32_000
+
+
+def merge_rows(model, owner, amount_field, ingredient_ids, keep_id,
+               max_amount=None):
+    """Переносит строки с ингредиентов-дублей на оставляемый ингредиент.
+
+    Если у владельца уже есть строка с оставляемым ингредиентом,
+    количества складываются.
+    """
+    for row in model.objects.filter(ingredient_id__in=ingredient_ids):
+        target = model.objects.filter(
+            **{f'{owner}_id': getattr(row, f'{owner}_id')},
+            ingredient_id=keep_id,
+        ).first()
+        if target is None:
+            row.ingredient_id = keep_id
+            row.save(update_fields=['ingredient'])
+            continue
+        amount = getattr(target, amount_field) + getattr(row, amount_field)
+        if max_amount is not None:
+            amount = min(amount, max_amount)
+        setattr(target, amount_field, amount)
+        target.save(update_fields=[amount_field])
+        row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(count=Count('id'), keep_id=Min('id'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates:
+        ingredient_ids = list(
+            Ingredient.objects.filter(
+                name=duplicate['name'],
+                measurement_unit=duplicate['measurement_unit'],
+            ).exclude(pk=duplicate['keep_id']).values_list('pk', flat=True)
+        )
+        merge_rows(
+            RecipeIngredient, 'recipe', 'amount', ingredient_ids,
+            duplicate['keep_id'], MAX_INGREDIENT_AMOUNT,
+        )
+        merge_rows(
+            ShoppingCartTotal, 'user', 'total_amount', ingredient_ids,
+            duplicate['keep_id'],
+        )
+        Ingredient.objects.filter(pk__in=ingredient_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-17 07:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_tags_lookup_idx'),
+    ]
+
+    # Таблица recipes_recipe_tags с ограничением уникальности и индексом
+    # recipe_tags_lookup_idx уже есть, меняется только состояние моделей.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RecipeTag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_tags', to='recipes.recipe', verbose_name='Рецепт')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_recipes', to='recipes.tag', verbose_name='Тег')),
+                    ],
+                    options={
+                        'verbose_name': 'Тег рецепта',
+                        'verbose_name_plural': 'Теги рецептов',
+                        'db_table': 'recipes_recipe_tags',
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='tags',
+                    field=models.ManyToManyField(related_name='recipes', through='recipes.RecipeTag', to='recipes.tag', verbose_name='Теги рецепта'),
+                ),
+                migrations.AddIndex(
+                    model_name='recipetag',
+                    index=models.Index(fields=['tag', 'recipe'], name='recipe_tags_lookup_idx'),
+                ),
+                migrations.AlterUniqueTogether(
+                    name='recipetag',
+                    unique_together={('recipe', 'tag')},
+                ),
+            ],
+        ),
+    ]
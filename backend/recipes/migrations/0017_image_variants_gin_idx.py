@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from recipes.operations import PostgresRunSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_tag'),
+        ('users', '0005_image_index'),
+    ]
+
+    # Индексы для поиска ссылок на копии изображений (оператор @>),
+    # см. recipes.images.is_referenced.
+    operations = [
+        PostgresRunSQL(
+            sql=(
+                'CREATE INDEX recipe_image_variants_idx ON recipes_recipe '
+                'USING gin (image_variants jsonb_path_ops);'
+            ),
+            reverse_sql='DROP INDEX recipe_image_variants_idx;',
+        ),
+        PostgresRunSQL(
+            sql=(
+                'CREATE INDEX user_avatar_variants_idx ON users_user '
+                'USING gin (avatar_variants jsonb_path_ops);'
+            ),
+            reverse_sql='DROP INDEX user_avatar_variants_idx;',
+        ),
+    ]
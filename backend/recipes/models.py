@@ -1,6 +1,22 @@
+import logging
+from heapq import merge
+
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField
+)
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (
+    Case, Count, Exists, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Greatest
+
+from users.models import Subscription
+
+logger = logging.getLogger(__name__)
 
 
 MIN_INGREDIENT_AMOUNT = 1
@@ -9,6 +25,8 @@ MAX_INGREDIENT_AMOUNT = 32_000
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32_000
 
+SEARCH_CONFIG = 'russian'
+
 
 class Tag(models.Model):
     """Модель тега для рецептов."""
@@ -34,7 +52,11 @@ class Tag(models.Model):
 
 
 class Ingredient(models.Model):
-    """Модель ингредиента для рецептов."""
+    """Модель ингредиента для рецептов.
+
+    Индексы по UPPER(name) для поиска создаются миграцией
+    0004_ingredient_search_indexes только на PostgreSQL.
+    """
 
     name = models.CharField(
         max_length=200,
@@ -49,13 +71,107 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet рецептов с вспомогательными аннотациями."""
+
+    def search(self, text):
+        """Полнотекстовый поиск с аннотацией search_rank.
+
+        На PostgreSQL ищет по search_vector, на других СУБД - по
+        вхождению в название, описание и названия ингредиентов.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            query = SearchQuery(
+                text, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return self.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            )
+        return self.filter(
+            Q(name__icontains=text)
+            | Q(text__icontains=text)
+            | Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient__name__icontains=text
+            ))
+        ).annotate(
+            search_rank=Case(
+                When(name__icontains=text, then=Value(1.0)),
+                default=Value(0.0),
+            )
+        )
+
+    def update_search_vector(self):
+        """Пересчитывает search_vector; вне PostgreSQL ничего не делает."""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        ingredient_names = (
+            RecipeIngredient.objects
+            .filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Subquery(ingredient_names), weight='B', config=SEARCH_CONFIG
+            )
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+
+    def with_any_tag(self, tag_ids):
+        """Рецепты хотя бы с одним из тегов, без дублей строк.
+
+        Проверяет теги через EXISTS, а не JOIN: рецепт с несколькими
+        подходящими тегами попадает в выборку один раз.
+        """
+        return self.filter(Exists(
+            RecipeTag.objects.filter(
+                recipe=OuterRef('pk'), tag_id__in=tag_ids
+            )
+        ))
+
+    def for_read(self):
+        """Готовит рецепты к сериализации за постоянное число запросов.
+
+        Персональные поля считает foodgram_api.viewer.ViewerState,
+        теги берутся из recipes.tags по id из recipe_tags.
+        """
+        return (
+            self.select_related('author')
+            .defer('search_vector')
+            .prefetch_related(
+                'recipe_tags',
+                Prefetch(
+                    'recipe_ingredients',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+            )
+        )
+
+
 class Recipe(models.Model):
-    """Модель рецепта."""
+    """Модель рецепта.
+
+    search_vector обновляется через RecipeQuerySet.update_search_vector
+    после сохранения ингредиентов; GIN-индекс по нему создаётся
+    миграцией 0010_recipe_search_vector только на PostgreSQL.
+    """
+
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -68,8 +184,14 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        db_index=True,
         verbose_name='Изображение рецепта'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения'
+    )
     text = models.TextField(
         verbose_name='Описание рецепта'
     )
@@ -90,8 +212,31 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество в избранном'
+    )
+    purchases_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество в списках покупок'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг в трендах'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
     tags = models.ManyToManyField(
         Tag,
+        through='RecipeTag',
         related_name='recipes',
         verbose_name='Теги рецепта'
     )
@@ -102,15 +247,92 @@ class Recipe(models.Model):
         verbose_name='Ингредиенты рецепта'
     )
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popularity_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-pub_date', '-id'],
+                name='recipe_trending_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} от {self.author}'
 
 
+class RecipeTag(models.Model):
+    """Промежуточная модель для связи рецепта и тега."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recipe_tags',
+        verbose_name='Рецепт'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='tag_recipes',
+        verbose_name='Тег'
+    )
+
+    class Meta:
+        db_table = 'recipes_recipe_tags'
+        verbose_name = 'Тег рецепта'
+        verbose_name_plural = 'Теги рецептов'
+        unique_together = ('recipe', 'tag')
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='recipe_tags_lookup_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.tag_id}'
+
+
+class RecipeIngredientQuerySet(models.QuerySet):
+    """QuerySet ингредиентов рецептов."""
+
+    def coverage(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Одним сгруппированным запросом возвращает строки с recipe,
+        covered (сколько ингредиентов рецепта есть) и missing (сколько
+        не хватает), от лучше покрытых рецептов к хуже.
+        """
+        candidates = self.filter(ingredient__in=ingredient_ids).values(
+            'recipe'
+        )
+        return (
+            self.filter(recipe__in=candidates)
+            .order_by()
+            .values('recipe')
+            .annotate(
+                covered=Count('pk', filter=Q(ingredient__in=ingredient_ids))
+            )
+            .annotate(missing=Count('pk') - F('covered'))
+            .order_by('-covered', 'missing', '-recipe_id')
+        )
+
+
 class RecipeIngredient(models.Model):
     """Промежуточная модель для связи рецепта и ингредиента с количеством."""
 
@@ -140,11 +362,19 @@ class RecipeIngredient(models.Model):
         verbose_name='Количество ингредиента'
     )
 
+    objects = RecipeIngredientQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
         unique_together = ('recipe', 'ingredient')
         ordering = ('recipe', 'ingredient')
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='recipe_ingredient_lookup_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.ingredient.name} в {self.recipe.name}: {self.amount}'
@@ -165,6 +395,11 @@ class Favorite(models.Model):
         related_name='favorited_by',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -192,6 +427,11 @@ class Purchase(models.Model):
         related_name='purchased_by',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Покупка'
@@ -202,3 +442,358 @@ class Purchase(models.Model):
     def __str__(self):
         return (f'Покупка рецепта {self.recipe.name} '
                 f'пользователя {self.user.username}')
+
+
+class ShoppingCartTotalManager(models.Manager):
+    """Поддерживает итоги списков покупок в актуальном состоянии."""
+
+    def add_recipe(self, user, recipe):
+        """Учитывает рецепт, добавленный в список покупок."""
+        self.apply_deltas([user.pk], self.get_recipe_amounts(recipe))
+
+    def remove_recipe(self, user, recipe):
+        """Учитывает рецепт, удалённый из списка покупок."""
+        amounts = self.get_recipe_amounts(recipe)
+        self.apply_deltas(
+            [user.pk],
+            {ingredient: -amount for ingredient, amount in amounts.items()}
+        )
+
+    def discard_recipe(self, recipe):
+        """Убирает рецепт из итогов всех пользователей перед его удалением."""
+        amounts = self.get_recipe_amounts(recipe)
+        self.apply_deltas(
+            self.get_purchaser_ids(recipe),
+            {ingredient: -amount for ingredient, amount in amounts.items()}
+        )
+
+    def update_recipe(self, recipe, old_amounts):
+        """Учитывает изменение ингредиентов рецепта.
+
+        old_amounts - словарь {id ингредиента: количество} до изменения.
+        """
+        new_amounts = self.get_recipe_amounts(recipe)
+        deltas = {
+            ingredient: (
+                new_amounts.get(ingredient, 0)
+                - old_amounts.get(ingredient, 0)
+            )
+            for ingredient in new_amounts.keys() | old_amounts.keys()
+        }
+        self.apply_deltas(self.get_purchaser_ids(recipe), deltas)
+
+    def get_recipe_amounts(self, recipe):
+        return dict(
+            recipe.recipe_ingredients.values_list('ingredient_id', 'amount')
+        )
+
+    def get_purchaser_ids(self, recipe):
+        return list(recipe.purchased_by.values_list('user_id', flat=True))
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет deltas {id ингредиента: изменение} к итогам.
+
+        Строки пользователей блокируются в порядке id, поэтому
+        параллельные изменения итогов одного пользователя выполняются
+        по очереди и не создают одну и ту же строку дважды. Итог,
+        который ушёл бы в минус, обнуляется и попадает в лог:
+        расхождение исправляет команда rebuild_shopping_carts.
+        """
+        deltas = {
+            ingredient: delta for ingredient, delta in deltas.items() if delta
+        }
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            list(
+                get_user_model().objects.select_for_update()
+                .filter(pk__in=user_ids)
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            existing = {
+                (user_id, ingredient): total_amount
+                for user_id, ingredient, total_amount in self.filter(
+                    user_id__in=user_ids, ingredient_id__in=deltas
+                ).values_list('user_id', 'ingredient_id', 'total_amount')
+            }
+            drifted = [
+                (user_id, ingredient)
+                for user_id in user_ids
+                for ingredient, delta in deltas.items()
+                if delta < 0
+                and existing.get((user_id, ingredient), 0) + delta < 0
+            ]
+            if drifted:
+                logger.warning(
+                    'Shopping cart totals went negative for '
+                    '(user, ingredient) %s, run rebuild_shopping_carts',
+                    drifted,
+                )
+            for ingredient, delta in deltas.items():
+                self.filter(
+                    user_id__in=user_ids, ingredient_id=ingredient
+                ).update(
+                    total_amount=Greatest(F('total_amount') + delta, 0)
+                )
+            self.bulk_create(
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient,
+                    total_amount=delta,
+                )
+                for user_id in user_ids
+                for ingredient, delta in deltas.items()
+                if delta > 0 and (user_id, ingredient) not in existing
+            )
+            self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=deltas,
+                total_amount=0,
+            ).delete()
+
+    def calculate(self, user_ids=None):
+        """Считает итоги заново по спискам покупок.
+
+        Возвращает итератор строк (user_id, ingredient_id, total_amount).
+        """
+        if user_ids is None:
+            lookup = {'recipe__purchased_by__isnull': False}
+        else:
+            lookup = {'recipe__purchased_by__user_id__in': user_ids}
+        return (
+            RecipeIngredient.objects
+            .filter(**lookup)
+            .values('recipe__purchased_by__user', 'ingredient')
+            .annotate(total_amount=Sum('amount'))
+            .order_by()
+            .values_list(
+                'recipe__purchased_by__user', 'ingredient', 'total_amount'
+            )
+            .iterator(chunk_size=2000)
+        )
+
+    def rebuild(self, user_ids=None):
+        """Пересобирает итоги всех или указанных пользователей."""
+        with transaction.atomic():
+            totals = self.all()
+            if user_ids is not None:
+                totals = totals.filter(user_id__in=user_ids)
+            totals.delete()
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient,
+                        total_amount=total_amount,
+                    )
+                    for user_id, ingredient, total_amount
+                    in self.calculate(user_ids)
+                ),
+                batch_size=1000,
+            )
+
+
+class ShoppingCartTotal(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество'
+    )
+
+    objects = ShoppingCartTotalManager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        ordering = ('user', 'ingredient')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_total'
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.ingredient.name}: {self.total_amount} '
+                f'в списке покупок {self.user.username}')
+
+
+class TimelineEntryManager(models.Manager):
+    """Поддерживает ленты подписок в актуальном состоянии.
+
+    Рецепты обычных авторов при публикации раскладываются по лентам
+    подписчиков. Рецепты авторов, у которых больше FEED_FANOUT_LIMIT
+    подписчиков, не раскладываются, а подмешиваются при чтении ленты.
+    Рецепты, опубликованные автором, пока он был популярным, попадут
+    в ленты после команды rebuild_timelines.
+    """
+
+    def is_popular(self, author_id):
+        """Популярен ли автор; счётчик подписчиков читается из базы."""
+        return get_user_model().objects.filter(
+            pk=author_id, followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).exists()
+
+    def fan_out(self, recipe):
+        """Добавляет новый рецепт в ленты подписчиков автора."""
+        if self.is_popular(recipe.author_id):
+            return
+        follower_ids = (
+            Subscription.objects
+            .filter(author_id=recipe.author_id)
+            .values_list('user_id', flat=True)
+            .iterator(chunk_size=2000)
+        )
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    recipe=recipe,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pub_date,
+                )
+                for user_id in follower_ids
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    def follow(self, user, author):
+        """Добавляет в ленту последние рецепты нового автора подписок."""
+        if self.is_popular(author.pk):
+            return
+        recipes = (
+            Recipe.objects
+            .filter(author=author)
+            .order_by('-pub_date', '-id')
+            .values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+        )
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user.pk,
+                    recipe_id=recipe_id,
+                    author_id=author.pk,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in recipes
+            ),
+            ignore_conflicts=True,
+        )
+
+    def unfollow(self, user, author):
+        """Убирает из ленты рецепты автора после отписки."""
+        self.filter(user=user, author=author).delete()
+
+    def rebuild(self, user_ids=None):
+        """Пересобирает ленты всех или указанных пользователей."""
+        subscriptions = Subscription.objects.select_related('user', 'author')
+        with transaction.atomic():
+            entries = self.all()
+            if user_ids is not None:
+                entries = entries.filter(user_id__in=user_ids)
+                subscriptions = subscriptions.filter(user_id__in=user_ids)
+            entries.delete()
+            for subscription in subscriptions.iterator(chunk_size=500):
+                self.follow(subscription.user, subscription.author)
+
+    def get_feed(self, user, position, limit):
+        """Ключи (pub_date, id) рецептов ленты после позиции position.
+
+        Строки ленты и рецепты популярных авторов выбираются по индексам
+        в порядке убывания ключа и сливаются без повторов.
+        """
+        entries = self.filter(user=user)
+        pulled = Recipe.objects.filter(author__in=(
+            Subscription.objects
+            .filter(
+                user=user,
+                author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+            )
+            .values('author')
+        ))
+        if position is not None:
+            pub_date, pk = position
+            entries = entries.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, recipe_id__lt=pk)
+            )
+            pulled = pulled.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        entries = entries.order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id'
+        )
+        pulled = pulled.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'pk'
+        )
+        keys = []
+        for key in merge(entries[:limit], pulled[:limit], reverse=True):
+            if not keys or keys[-1] != key:
+                keys.append(key)
+        return keys[:limit]
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    objects = TimelineEntryManager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        ordering = ('user', '-pub_date', '-recipe')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_entry_feed_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_entry_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} в ленте {self.user_id}'
@@ -0,0 +1,30 @@
+"""Операции миграций, которые выполняются только на PostgreSQL.
+
+На других СУБД (например, SQLite в тестах) они пропускаются.
+"""
+from django.db import migrations
+
+
+class PostgresOnlyMixin:
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+class PostgresRunSQL(PostgresOnlyMixin, migrations.RunSQL):
+    """RunSQL для объектов схемы, специфичных для PostgreSQL.
+
+    Такие индексы не описываются в Meta.indexes: иначе SQLite
+    попытается воссоздать их при перестройке таблицы.
+    """
@@ -0,0 +1,57 @@
+"""Короткие ссылки на рецепты.
+
+Код - это id рецепта в base62, поэтому для перехода по ссылке
+не нужна ни отдельная таблица, ни чтение строки рецепта: проверяется
+только существование id, и результат кэшируется.
+"""
+from string import ascii_letters, digits
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Recipe
+
+ALPHABET = digits + ascii_letters
+BASE = len(ALPHABET)
+INDEX = {char: position for position, char in enumerate(ALPHABET)}
+MAX_ID = 2 ** 63 - 1
+
+
+def encode(number):
+    code = ''
+    while True:
+        number, remainder = divmod(number, BASE)
+        code = ALPHABET[remainder] + code
+        if not number:
+            return code
+
+
+def decode(code):
+    """id по коду или None, если код некорректен."""
+    if not code or code[0] == '0' and len(code) > 1:
+        return None
+    number = 0
+    for char in code:
+        if char not in INDEX:
+            return None
+        number = number * BASE + INDEX[char]
+        if number > MAX_ID:
+            return None
+    return number
+
+
+def get_cache_key(pk):
+    return f'recipes:short_link:{pk}'
+
+
+def recipe_exists(pk):
+    key = get_cache_key(pk)
+    exists = cache.get(key)
+    if exists is None:
+        exists = Recipe.objects.filter(pk=pk).exists()
+        cache.set(key, exists, settings.SHORT_LINK_CACHE_TIMEOUT)
+    return exists
+
+
+def forget_recipe(pk):
+    cache.delete(get_cache_key(pk))
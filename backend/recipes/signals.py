@@ -0,0 +1,179 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from recipes.catalogue import bump_catalogue_version
+from recipes.images import (
+    release_deleted_files, release_replaced_files, remember_replaced_files,
+    sync_variants
+)
+from recipes.models import (
+    Favorite, Ingredient, Purchase, Recipe, RecipeIngredient, RecipeTag, Tag,
+    TimelineEntry
+)
+from recipes.short_links import forget_recipe
+from recipes.versions import (
+    POPULARITY_VERSION, RECIPES_VERSION, TAGS_VERSION, USERS_VERSION,
+    bump_version, get_viewer_version_key
+)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_catalogue(**kwargs):
+    """Сбрасывает снимки справочника ингредиентов при его изменении."""
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipes_search_vector(instance, created, **kwargs):
+    """Обновляет поисковый вектор рецептов с переименованным ингредиентом."""
+    if not created:
+        Recipe.objects.filter(
+            recipe_ingredients__ingredient=instance
+        ).update_search_vector()
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(instance, update_fields=None, **kwargs):
+    remember_replaced_files(
+        instance, 'image', 'image_variants', update_fields
+    )
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_avatar(instance, update_fields=None, **kwargs):
+    remember_replaced_files(
+        instance, 'avatar', 'avatar_variants', update_fields
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_image_variants(instance, **kwargs):
+    """Строит копии нового изображения рецепта и освобождает старое."""
+    sync_variants(instance, 'image', 'image_variants')
+    release_replaced_files(instance, 'image')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_avatar_variants(instance, **kwargs):
+    """Строит копии нового аватара и освобождает старый."""
+    sync_variants(instance, 'avatar', 'avatar_variants')
+    release_replaced_files(instance, 'avatar')
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(instance, **kwargs):
+    release_deleted_files(instance, 'image', 'image_variants')
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def release_avatar(instance, **kwargs):
+    release_deleted_files(instance, 'avatar', 'avatar_variants')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_short_link(instance, created=True, **kwargs):
+    """Сбрасывает кэш короткой ссылки на созданный или удалённый рецепт."""
+    if created:
+        forget_recipe(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeTag)
+def invalidate_recipes(**kwargs):
+    """Сбрасывает закэшированные ответы с рецептами."""
+    bump_version(RECIPES_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def invalidate_popularity(**kwargs):
+    """Сбрасывает ответы с рецептами, упорядоченными по популярности."""
+    bump_version(POPULARITY_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """Сбрасывает ответы со списком тегов и рецептами."""
+    bump_version(TAGS_VERSION)
+    bump_version(RECIPES_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=Purchase)
+@receiver((post_save, post_delete), sender='users.Subscription')
+def invalidate_viewer_state(instance, **kwargs):
+    """Сбрасывает персональные поля в ответах для пользователя."""
+    bump_version(get_viewer_version_key(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=settings.AUTH_USER_MODEL)
+def invalidate_recipes_by_author(update_fields=None, **kwargs):
+    """Сбрасывает ответы с рецептами при изменении данных автора.
+
+    Обновление last_login при входе на выдачу рецептов не влияет.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version(USERS_VERSION)
+    bump_version(RECIPES_VERSION)
+
+
+def change_counter(model, pk, field, signal, created=False, raw=False,
+                   **kwargs):
+    """Поддерживает счётчик связанных записей.
+
+    Созданная запись увеличивает счётчик, удалённая уменьшает, но не
+    ниже нуля. Через сигналы учитываются и удаления через админку
+    и каскадом. Записи из фикстур (raw) счётчики не меняют.
+    """
+    if raw:
+        return
+    if signal is post_delete:
+        delta = -1
+    elif created:
+        delta = 1
+    else:
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipes_count(instance, **kwargs):
+    change_counter(
+        get_user_model(), instance.author_id, 'recipes_count', **kwargs
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, raw=False, **kwargs):
+    """Раскладывает новый рецепт по лентам подписчиков после коммита."""
+    if created and not raw:
+        transaction.on_commit(lambda: TimelineEntry.objects.fan_out(instance))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def update_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', **kwargs)
+
+
+@receiver((post_save, post_delete), sender=Purchase)
+def update_purchases_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'purchases_count', **kwargs)
+
+
+@receiver((post_save, post_delete), sender='users.Subscription')
+def update_followers_count(instance, **kwargs):
+    change_counter(
+        get_user_model(), instance.author_id, 'followers_count', **kwargs
+    )
@@ -0,0 +1,68 @@
+"""Теги в памяти процесса.
+
+Тегов мало и они почти не меняются, поэтому их снимок загружается
+при первом обращении и живёт, пока не изменится версия в кэше.
+Версию увеличивают сигналы модели Tag. Снимок используют список
+тегов, теги в рецептах и фильтр рецептов по тегам.
+"""
+from threading import Lock
+
+from recipes.models import Tag
+from recipes.versions import TAGS_VERSION, get_version
+
+_registry = None
+_registry_lock = Lock()
+
+
+class TagRegistry:
+    """Неизменяемый снимок тегов.
+
+    Теги хранятся несохраняемыми экземплярами Tag в порядке модели,
+    чтобы их можно было отдавать TagSerializer.
+    """
+
+    __slots__ = ('version', 'tags', 'tags_by_id', 'ids_by_slug')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.tags = tuple(
+            Tag(id=pk, name=name, slug=slug) for pk, name, slug in rows
+        )
+        self.tags_by_id = {tag.pk: tag for tag in self.tags}
+        self.ids_by_slug = {tag.slug: tag.pk for tag in self.tags}
+
+    def get_choices(self):
+        return [(slug, slug) for slug in self.ids_by_slug]
+
+    def get_ids(self, slugs):
+        """id тегов с указанными слагами; неизвестные слаги пропускаются."""
+        return [
+            self.ids_by_slug[slug] for slug in slugs
+            if slug in self.ids_by_slug
+        ]
+
+    def get_tags(self, ids):
+        """Теги с указанными id в порядке модели."""
+        ids = set(ids)
+        return [tag for tag in self.tags if tag.pk in ids]
+
+
+def get_tag_registry():
+    """Возвращает актуальный снимок тегов, при необходимости
+    перечитывая его из базы."""
+    global _registry
+    version = get_version(TAGS_VERSION)
+    registry = _registry
+    if registry is None or registry.version != version:
+        with _registry_lock:
+            if _registry is None or _registry.version != version:
+                _registry = TagRegistry(
+                    version,
+                    Tag.objects.values_list('id', 'name', 'slug'),
+                )
+            registry = _registry
+    return registry
+
+
+def get_tag_choices():
+    return get_tag_registry().get_choices()
@@ -0,0 +1,239 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from recipes.images import is_referenced
+from recipes.models import (
+    Favorite, Ingredient, Purchase, Recipe, RecipeIngredient,
+    ShoppingCartTotal, TimelineEntry
+)
+from recipes.versions import bump_version, get_version, get_versions
+from users.models import Subscription, User
+
+
+class RecipesTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Password12345!',
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(3)
+        ]
+
+    def make_recipe(self, amounts, author=None):
+        recipe = Recipe.objects.create(
+            author=author or self.user,
+            name='Рецепт',
+            text='Описание',
+            cooking_time=10,
+            image='recipes/image.png',
+        )
+        for ingredient, amount in zip(self.ingredients, amounts):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+
+
+class ShoppingCartTotalTest(RecipesTestCase):
+
+    def get_totals(self):
+        return dict(
+            ShoppingCartTotal.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'total_amount'
+            )
+        )
+
+    def test_add_and_remove(self):
+        first = self.make_recipe([1, 2])
+        second = self.make_recipe([3, 4, 5])
+        for recipe in (first, second):
+            Purchase.objects.create(user=self.user, recipe=recipe)
+            ShoppingCartTotal.objects.add_recipe(self.user, recipe)
+        self.assertEqual(self.get_totals(), {
+            self.ingredients[0].pk: 4,
+            self.ingredients[1].pk: 6,
+            self.ingredients[2].pk: 5,
+        })
+
+        Purchase.objects.filter(recipe=second).delete()
+        ShoppingCartTotal.objects.remove_recipe(self.user, second)
+        self.assertEqual(self.get_totals(), {
+            self.ingredients[0].pk: 1,
+            self.ingredients[1].pk: 2,
+        })
+
+    def test_negative_total_is_logged(self):
+        recipe = self.make_recipe([1, 2])
+        with self.assertLogs('recipes.models', 'WARNING'):
+            ShoppingCartTotal.objects.remove_recipe(self.user, recipe)
+        self.assertEqual(self.get_totals(), {})
+
+
+class CountersTest(RecipesTestCase):
+
+    def test_cascade_delete(self):
+        follower = User.objects.create_user(
+            email='follower@example.com',
+            username='follower',
+            password='Password12345!',
+        )
+        recipe = self.make_recipe([1])
+        Favorite.objects.create(user=follower, recipe=recipe)
+        Purchase.objects.create(user=follower, recipe=recipe)
+        Subscription.objects.create(user=follower, author=self.user)
+        recipe.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.purchases_count), (1, 1)
+        )
+        self.assertEqual(self.user.followers_count, 1)
+
+        follower.delete()
+        recipe.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.purchases_count), (0, 0)
+        )
+        self.assertEqual(self.user.followers_count, 0)
+
+    def test_new_recipe_is_counted_and_fanned_out(self):
+        follower = User.objects.create_user(
+            email='follower@example.com',
+            username='follower',
+            password='Password12345!',
+        )
+        Subscription.objects.create(user=follower, author=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='Описание',
+                cooking_time=10,
+            )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=follower, recipe=recipe)
+            .exists()
+        )
+
+    def test_counters_do_not_go_negative(self):
+        recipe = self.make_recipe([1])
+        User.objects.filter(pk=self.user.pk).update(recipes_count=0)
+        recipe.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 0)
+
+
+class TrendingScoresTest(RecipesTestCase):
+
+    def test_scores_and_reset(self):
+        stale = self.make_recipe([1])
+        fresh = self.make_recipe([1])
+        Recipe.objects.filter(pk=stale.pk).update(trending_score=5)
+        Favorite.objects.create(user=self.user, recipe=fresh)
+        call_command('update_trending_scores', stdout=StringIO())
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.trending_score, 0)
+        self.assertGreater(fresh.trending_score, 0)
+
+
+class ImageReferencesTest(RecipesTestCase):
+
+    def test_is_referenced(self):
+        recipe = self.make_recipe([1])
+        Recipe.objects.filter(pk=recipe.pk).update(image_variants={
+            'source': 'recipes/image.png',
+            'thumbnail': 'recipes/variants/thumbnail.webp',
+        })
+        self.assertTrue(is_referenced('recipes/image.png'))
+        self.assertTrue(is_referenced('recipes/variants/thumbnail.webp'))
+        self.assertFalse(is_referenced('recipes/variants/card.webp'))
+
+
+class BuildImageVariantsTest(RecipesTestCase):
+
+    def test_undecodable_image_is_not_retried(self):
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                recipe = self.make_recipe([1])
+                recipe.image.save(
+                    'image.png',
+                    ContentFile(b'\x89PNG\r\n\x1a\n' + os.urandom(512)),
+                    save=False,
+                )
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    image=recipe.image.name
+                )
+                for _ in range(2):
+                    stdout = StringIO()
+                    call_command('build_image_variants', stdout=stdout)
+                recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants['source'], recipe.image.name)
+        self.assertIn('error', recipe.image_variants)
+        self.assertIn('Recipe.image: built variants for 0 files', (
+            stdout.getvalue()
+        ))
+
+
+class LoadIngredientsTest(TestCase):
+
+    def load(self, content, *args):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8'
+        ) as file:
+            file.write(content)
+            file.flush()
+            call_command(
+                'load_ingredients', '--format', 'csv', '--path', file.name,
+                *args,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+
+    def test_malformed_rows_are_skipped(self):
+        self.load('соль,г\nперец\n,г\nсоль,г\nсахар,г\n')
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            {('соль', 'г'), ('сахар', 'г')},
+        )
+
+    def test_batch_size_must_be_positive(self):
+        for batch_size in ('0', '-1'):
+            with self.subTest(batch_size=batch_size):
+                with self.assertRaises(CommandError):
+                    self.load('соль,г\n', '--batch-size', batch_size)
+
+
+class VersionTest(TestCase):
+
+    key = 'tests:version'
+
+    def setUp(self):
+        cache.delete(self.key)
+
+    def test_evicted_version_is_not_repeated(self):
+        seen = {get_version(self.key)}
+        bump_version(self.key)
+        seen.add(get_version(self.key))
+        cache.delete(self.key)
+        self.assertNotIn(get_version(self.key), seen)
+        cache.delete(self.key)
+        bump_version(self.key)
+        self.assertNotIn(get_version(self.key), seen)
+
+    def test_missing_version_is_stable(self):
+        self.assertEqual(get_versions(self.key), get_versions(self.key))
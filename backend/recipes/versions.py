@@ -0,0 +1,76 @@
+"""Счётчики версий данных в общем кэше.
+
+По изменившейся версии процессы понимают, что их локальные снимки
+и закэшированные ответы устарели. Отсутствующая в кэше версия
+(например, вытесненная) заводится заново со значением time.time_ns(),
+а не с нуля, чтобы не совпасть ни с одной из уже выданных версий.
+Счётчики работают, только если кэш общий для всех процессов.
+"""
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+
+INGREDIENTS_VERSION = 'recipes:ingredients_version'
+RECIPES_VERSION = 'recipes:recipes_version'
+POPULARITY_VERSION = 'recipes:popularity_version'
+TAGS_VERSION = 'recipes:tags_version'
+USERS_VERSION = 'users:users_version'
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_viewer_version_key(user_id):
+    """Версия избранного, списка покупок и подписок пользователя."""
+    return f'users:{user_id}:viewer_version'
+
+
+def seed_version(key):
+    """Заводит отсутствующую версию и возвращает её значение."""
+    version = time.time_ns()
+    if cache.add(key, version, timeout=None):
+        return version
+    return cache.get(key, version)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        return seed_version(key)
+    return version
+
+
+def get_versions(*keys):
+    versions = cache.get_many(keys)
+    return tuple(
+        versions[key] if key in versions else seed_version(key)
+        for key in keys
+    )
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, time.time_ns(), timeout=None):
+            cache.incr(key)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        f'Cache backend {backend} is not shared between processes.',
+        hint=(
+            'Data versions, cached responses and in-process snapshots '
+            'of tags and ingredients will go stale in other workers. '
+            'Set CACHE_BACKEND to Redis or Memcached in production.'
+        ),
+        id='recipes.W001',
+    )]
@@ -23,7 +23,9 @@ class UserAdmin(UserAdmin):
             'groups', 'user_permissions',
         )}),
         ('Важные даты', {'fields': ('last_login', 'date_joined')}),
+        ('Статистика', {'fields': ('recipes_count', 'followers_count')}),
     )
+    readonly_fields = ('recipes_count', 'followers_count')
     add_fieldsets = (
         (None, {
             'classes': ('wide',),
@@ -28,14 +28,28 @@ class User(AbstractUser):
     )
     avatar = models.ImageField(
         upload_to='avatars/',
+        db_index=True,
         blank=True,
         null=True,
         verbose_name='Аватар',
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Уменьшенные копии аватара',
+    )
     password = models.CharField(
         max_length=150,
         verbose_name='Пароль',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']